@@ -1,16 +1,27 @@
-from fastapi import FastAPI, File, UploadFile, Form, Request, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse
+from fastapi import FastAPI, File, UploadFile, Form, Request, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+import asyncio
+import json
 import os
-import shutil
-from utils.db import DBLogger
-from drill_evaluator import process_drill  # ✅ Pose + ball tracking
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlencode
+from utils.db import DBLogger, PoolTimeoutError, close_pool
+from utils.jobs import JobManager, QueueFullError
+from utils.metrics import HTTP_SECONDS, JOBS, REGISTRY
+from utils.scoring import rescore_drill
+from utils.similarity import CONFIDENCE_THRESHOLD
+from utils.upload_store import MAX_UPLOAD_MB, ProcessedIndex, UploadTooLargeError, save_upload
+from drill_evaluator import load_coach_reference, match_drill, process_drill  # ✅ Pose + ball tracking (models load on first use)
+from services.model_registry import models, warmup_names
+from live_evaluator import LIVE_MAX_FPS, LiveSession, run_live_session
 
 app = FastAPI()
-
-UPLOAD_DIR = "videos"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+jobs = JobManager()
+processed = ProcessedIndex()
 
 # Serve static files and templates
 app.mount("/static", StaticFiles(directory="results"), name="static")
@@ -32,59 +43,310 @@ def root():
     """
 
 
+# 🚧 Reject oversized uploads before the multipart body is read
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.url.path == "/v1/upload-drill/":
+        content_length = request.headers.get("content-length")
+        # Two videos per request
+        if content_length and int(content_length) > 2 * MAX_UPLOAD_MB * 1024 * 1024:
+            return JSONResponse(status_code=413, content={"detail": f"Upload exceeds {2 * MAX_UPLOAD_MB:.0f} MB."})
+    return await call_next(request)
+
+
+# 🚦 Every pooled connection busy for DB_POOL_TIMEOUT: report overload instead of hanging
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+# ⏱️ Request latency per route template (outermost middleware, so rejected uploads count too)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                             route=getattr(route, "path", "unmatched"), status=status)
+
+
+def parse_prompts(text):
+    # "dribbling, shooting, passing" → ["dribbling", "shooting", "passing"]; empty → None (default labels)
+    prompts = [prompt.strip() for prompt in (text or "").split(",") if prompt.strip()]
+    return prompts or None
+
+
+def process_uploaded_drill(drill_id, coach, student, progress=None, prompts=None):
+    result = process_drill(
+        drill_id=drill_id, coach_path=coach.path, student_path=student.path,
+        coach_hash=coach.content_hash, progress=progress, prompts=prompts
+    )
+    # Stored results are only reused for the default label set
+    if prompts is None:
+        processed.save(coach.content_hash, student.content_hash, drill_id, result)
+    return result
+
+
 # 🎥 Upload Drill Videos
 @app.post("/v1/upload-drill/")
 async def upload_both_videos(
     drill_id: int = Form(...),
     coach_video: UploadFile = File(...),
-    student_video: UploadFile = File(...)
+    student_video: UploadFile = File(...),
+    prompts: Optional[str] = Form(None)
 ):
-    coach_filename = f"coach_drill{drill_id}.MP4"
-    student_filename = f"student_drill{drill_id}.MP4"
+    # ✅ Stream both files into the content-addressed store
+    try:
+        coach = await save_upload(coach_video)
+        student = await save_upload(student_video)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # ✅ Identical re-upload: reuse the stored results
+    prompts = parse_prompts(prompts)
+    record = processed.get(coach.content_hash, student.content_hash) if prompts is None else None
+    if record is not None:
+        return JSONResponse({
+            "message": f"✅ Drill {drill_id} was already processed as {record['drill_id']}.",
+            "duplicate": True,
+            "coach_video": coach.path,
+            "student_video": student.path,
+            "result": record["result"]
+        })
+
+    # ✅ Queue the evaluator off the event loop
+    try:
+        job = jobs.submit(
+            process_uploaded_drill,
+            drill_id=f"Drill {drill_id}", coach=coach, student=student, prompts=prompts,
+            job_key=(coach.content_hash, student.content_hash, tuple(prompts or ()))
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-    coach_path = os.path.join(UPLOAD_DIR, coach_filename)
-    student_path = os.path.join(UPLOAD_DIR, student_filename)
+    return JSONResponse(status_code=202, content={
+        "message": f"✅ Drill {drill_id} uploaded and queued.",
+        "job_id": job.id,
+        "status_url": f"/v1/jobs/{job.id}",
+        "events_url": f"/v1/jobs/{job.id}/events",
+        "coach_video": coach.path,
+        "student_video": student.path
+    })
 
-    with open(coach_path, "wb") as f:
-        shutil.copyfileobj(coach_video.file, f)
 
-    with open(student_path, "wb") as f:
-        shutil.copyfileobj(student_video.file, f)
+# ⏳ Job status
+@app.get("/v1/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
 
-    # ✅ Run evaluator
-    process_drill(drill_id=f"Drill {drill_id}", coach_path=coach_path, student_path=student_path)
 
-    return JSONResponse({
-        "message": f"✅ Drill {drill_id} uploaded and processed.",
-        "coach_video": coach_path,
-        "student_video": student_path,
-        "result_video": f"results/overlay_drill_{drill_id}.mp4"
-    })
+# 📡 Job progress as server-sent events
+@app.get("/v1/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def events():
+        last_version = None
+        while True:
+            if job.version != last_version:
+                last_version = job.version
+                yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.finished:
+                yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+# 🔁 Rescore a processed drill from its stored artifacts (no model inference)
+@app.post("/v1/drills/{drill_id}/rescore")
+def rescore_stored_drill(
+    drill_id: int,
+    threshold: float = Form(CONFIDENCE_THRESHOLD),
+    align: bool = Form(True),
+    write_db: bool = Form(False),
+    prompts: Optional[str] = Form(None)
+):
+    try:
+        result = rescore_drill(f"Drill {drill_id}", threshold=threshold, align=align, write_db=write_db,
+                               prompts=parse_prompts(prompts))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {
+        "message": f"✅ Drill {drill_id} rescored.",
+        "threshold": threshold,
+        "align": align,
+        **result
+    }
+
+
+# 🔎 Match a clip against the library of processed coach drills
+@app.post("/v1/drills/match")
+async def match_drill_library(
+    video: UploadFile = File(...),
+    k: int = Form(5)
+):
+    if k < 1:
+        raise HTTPException(status_code=422, detail="k must be >= 1.")
+    try:
+        upload = await save_upload(video)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # CLIP runs off the event loop; the index lookup itself is one matrix multiply
+    started = time.perf_counter()
+    try:
+        result = await asyncio.to_thread(match_drill, upload.path, k)
+    except (IOError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    return {
+        "video": upload.path,
+        "k": k,
+        "seconds": round(time.perf_counter() - started, 3),
+        **result
+    }
+
+
+# 📡 Live evaluation: stream student frames against a cached coach reference
+@app.websocket("/v1/live")
+async def live_evaluation(
+    websocket: WebSocket,
+    coach_hash: Optional[str] = None,
+    drill_id: Optional[int] = None,
+    fps: float = 30.0,
+    max_fps: float = LIVE_MAX_FPS,
+    prompts: Optional[str] = None
+):
+    await websocket.accept()
+
+    def open_session():
+        coach = load_coach_reference(coach_hash=coach_hash,
+                                     drill_id=f"Drill {drill_id}" if drill_id is not None else None)
+        return LiveSession(coach, fps=fps, prompts=parse_prompts(prompts))
+
+    try:
+        # Reference lookup and model loading (first session) stay off the event loop
+        session = await asyncio.to_thread(open_session)
+    except (FileNotFoundError, ValueError) as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1008)
+        return
+
+    await websocket.send_json({"type": "ready", "coach_frames": len(session.coach["keypoints"]),
+                               "labels": session.labels, "max_fps": max_fps})
+    try:
+        summary = await run_live_session(websocket, session, max_fps=max_fps)
+        await websocket.send_json({"type": "summary", **summary})
+        await websocket.close()
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # client went away mid-stream
+
+
+# 📈 Prometheus metrics: stage latency histograms, frames, drill fps, job queue, HTTP latency
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    for status, count in jobs.status_counts().items():
+        JOBS.set(count, status=status)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+# 🔥 Optional warm-up (WARMUP_MODELS=movenet,clip or all) on a background thread, so
+# the worker starts serving immediately and the first drill does not pay model load time
+@app.on_event("startup")
+def on_startup():
+    names = warmup_names()
+    if names:
+        threading.Thread(target=models.warm_up, args=(names,), name="model-warmup", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    jobs.shutdown(wait=False)
+    close_pool()
 
 
 # 📊 Performance Report Page (Visual HTML Report)
+REPORT_PAGE_MAX = 1000
+
+
 @app.get("/v1/performance/report", response_class=HTMLResponse)
-def generate_report(request: Request):
-    db = DBLogger()
-    db.cursor.execute("""
-        SELECT drill_id, frame_num, coach_acc, student_acc, pose_sim, ball1, ball2, clip_label, clip_sim
-        FROM performance ORDER BY frame_num ASC
-    """)
-    rows = db.cursor.fetchall()
-    db.close()
-
-    total = len(rows)
-    coach_avg = round(sum(r[2] for r in rows) / total, 2) if total else 0
-    student_avg = round(sum(r[3] for r in rows) / total, 2) if total else 0
-    sim_avg = round(sum(r[4] for r in rows) / total, 2) if total else 0
+def generate_report(
+    request: Request,
+    drill_id: Optional[str] = None,
+    limit: int = 100,
+    after_frame: Optional[int] = None,
+    after_id: Optional[int] = None
+):
+    limit = max(1, min(limit, REPORT_PAGE_MAX))
+    drill_filter = "WHERE drill_id = %s" if drill_id else ""
+    drill_params = (drill_id,) if drill_id else ()
+
+    with DBLogger() as db:
+        # ✅ Summary computed in SQL, independent of table size
+        db.cursor.execute(f"""
+            SELECT COUNT(*), AVG(coach_acc), AVG(student_acc), AVG(pose_sim)
+            FROM performance {drill_filter}
+        """, drill_params)
+        total, coach_avg, student_avg, sim_avg = db.cursor.fetchone()
+
+        drills = db.fetch_dicts(f"""
+            SELECT drill_id, COUNT(*) AS frames, AVG(coach_acc) AS coach_avg,
+                   AVG(student_acc) AS student_avg, AVG(pose_sim) AS sim_avg
+            FROM performance {drill_filter}
+            GROUP BY drill_id ORDER BY drill_id
+        """, drill_params)
+
+        # ✅ Keyset pagination on (frame_num, id)
+        conditions, params = [], list(drill_params)
+        if drill_id:
+            conditions.append("drill_id = %s")
+        if after_frame is not None and after_id is not None:
+            conditions.append("(frame_num, id) > (%s, %s)")
+            params += [after_frame, after_id]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        rows = db.fetch_dicts(f"""
+            SELECT id, drill_id, frame_num, coach_acc, student_acc, pose_sim, ball1, ball2, clip_label, clip_sim
+            FROM performance {where}
+            ORDER BY frame_num ASC, id ASC
+            LIMIT %s
+        """, params + [limit])
+
+    next_page = None
+    if len(rows) == limit:
+        query = {"limit": limit, "after_frame": rows[-1]["frame_num"], "after_id": rows[-1]["id"]}
+        if drill_id:
+            query["drill_id"] = drill_id
+        next_page = f"/v1/performance/report?{urlencode(query)}"
+
+    for drill in drills:
+        for key in ("coach_avg", "student_avg", "sim_avg"):
+            drill[key] = round(drill[key], 2) if drill[key] is not None else 0
 
     return templates.TemplateResponse("report.html", {
         "request": request,
+        "drill_id": drill_id,
         "rows": rows,
+        "drills": drills,
         "total": total,
-        "coach_avg": coach_avg,
-        "student_avg": student_avg,
-        "sim_avg": sim_avg
+        "coach_avg": round(coach_avg, 2) if total else 0,
+        "student_avg": round(student_avg, 2) if total else 0,
+        "sim_avg": round(sim_avg, 2) if total else 0,
+        "next_page": next_page
     })
 
 
@@ -108,27 +370,25 @@ def store_player_performance(
     player_id: str = Form(...),
     drill_id: str = Form(...)
 ):
-    db = DBLogger()
-    db.cursor.execute("""
-        SELECT coach_acc, student_acc, pose_sim
-        FROM performance
-        WHERE drill_id = %s
-    """, (drill_id,))
-    rows = db.cursor.fetchall()
-
-    if not rows:
-        db.close()
-        return JSONResponse(
-            status_code=404,
-            content={"error": f"No frame data found for {drill_id}"}
-        )
+    with DBLogger() as db:
+        db.cursor.execute("""
+            SELECT COUNT(*), AVG(coach_acc), AVG(student_acc), AVG(pose_sim)
+            FROM performance
+            WHERE drill_id = %s
+        """, (drill_id,))
+        count, coach_avg, student_avg, pose_avg = db.cursor.fetchone()
+
+        if not count:
+            return JSONResponse(
+                status_code=404,
+                content={"error": f"No frame data found for {drill_id}"}
+            )
 
-    coach_avg = round(sum(r[0] for r in rows) / len(rows), 2)
-    student_avg = round(sum(r[1] for r in rows) / len(rows), 2)
-    pose_avg = round(sum(r[2] for r in rows) / len(rows), 2)
+        coach_avg = round(coach_avg, 2)
+        student_avg = round(student_avg, 2)
+        pose_avg = round(pose_avg, 2)
 
-    db.insert_player_performance(player_id, drill_id, coach_avg, student_avg, pose_avg)
-    db.close()
+        db.insert_player_performance(player_id, drill_id, coach_avg, student_avg, pose_avg)
 
     return {
         "message": "✅ Player performance summary saved.",
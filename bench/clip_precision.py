@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from bench.synthetic import generate_pair
+
+
+def sample_video_frames(paths, frames_per_video):
+    from services.video_service import VideoService
+    frames = []
+    for path in paths:
+        video = VideoService(path)
+        try:
+            frames.extend(video.sample_frames(frames_per_video))
+        finally:
+            video.release()
+    return frames
+
+
+def encode_timed(clip, frames):
+    clip.encode_frames(frames[:clip.batch_size])  # warm-up
+    started = time.perf_counter()
+    embeddings, logits = clip.encode_frames(frames)
+    return embeddings, logits, time.perf_counter() - started
+
+
+def agreement_report(reference, candidate):
+    # Label agreement and embedding cosine drift of `candidate` against the fp32 `reference`
+    ref_embeddings, ref_logits = reference
+    embeddings, logits = candidate
+    cosine = np.sum(ref_embeddings * embeddings, axis=1)
+    drift = 1.0 - cosine
+    return {
+        "label_agreement": round(float(np.mean(ref_logits.argmax(axis=1) == logits.argmax(axis=1))), 4),
+        "cosine_mean": round(float(cosine.mean()), 4),
+        "cosine_min": round(float(cosine.min()), 4),
+        "drift_mean": round(float(drift.mean()), 4),
+        "drift_p95": round(float(np.percentile(drift, 95)), 4),
+    }
+
+
+def compare_precisions(frames, precisions=("int8", "bf16"), prompts=None):
+    # ✅ Encode the same frames at fp32 and each reduced precision; report speed + accuracy
+    from services.clip_service import CLIPService
+    reference = CLIPService(precision="fp32")
+    labels = list(prompts) if prompts else reference.labels
+    ref_embeddings, _, ref_seconds = encode_timed(reference, frames)
+    ref_logits = reference.prompt_logits(ref_embeddings, labels)
+    report = {"fp32": {"fps": round(len(frames) / ref_seconds, 2), "speedup": 1.0}}
+    text_cache = reference.text_cache
+    del reference
+
+    for precision in precisions:
+        clip = CLIPService(precision=precision, text_cache=text_cache)
+        embeddings, _, seconds = encode_timed(clip, frames)
+        logits = clip.prompt_logits(embeddings, labels)
+        report[precision] = {
+            "fps": round(len(frames) / seconds, 2),
+            "speedup": round(ref_seconds / seconds, 2),
+            **agreement_report((ref_embeddings, ref_logits), (embeddings, logits))
+        }
+        del clip
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare reduced-precision CLIP against fp32.")
+    parser.add_argument("--video", action="append", default=[],
+                        help="Video to sample frames from (repeatable; default: synthetic drill pair)")
+    parser.add_argument("--frames", type=int, default=128, help="Frames sampled per video")
+    parser.add_argument("--precisions", default="int8,bf16", help="Comma list of: int8, bf16")
+    parser.add_argument("--prompts", nargs="+", default=None, help="Label prompts (default: service labels)")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="Minimum label agreement with fp32")
+    parser.add_argument("--max-drift", type=float, default=0.02, help="Maximum mean embedding drift (1 - cosine)")
+    parser.add_argument("--out", default="results/bench/clip_precision.json")
+    args = parser.parse_args()
+
+    paths = args.video or list(generate_pair())
+    frames = sample_video_frames(paths, args.frames)
+    if not frames:
+        parser.error("no frames could be decoded")
+    precisions = [p.strip() for p in args.precisions.split(",") if p.strip()]
+
+    print(f"🎥 {len(frames)} frame(s) from {len(paths)} video(s)")
+    report = compare_precisions(frames, precisions, args.prompts)
+
+    failed = []
+    for precision, outcome in report.items():
+        if precision == "fp32":
+            print(f"ℹ️ fp32: {outcome['fps']} fps")
+            continue
+        ok = outcome["label_agreement"] >= args.min_agreement and outcome["drift_mean"] <= args.max_drift
+        if not ok:
+            failed.append(precision)
+        print(f"{'✅' if ok else '❌'} {precision}: {outcome['fps']} fps ({outcome['speedup']}x) | "
+              f"label agreement {outcome['label_agreement']:.1%} | cosine mean {outcome['cosine_mean']} "
+              f"min {outcome['cosine_min']} | drift p95 {outcome['drift_p95']}")
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"frames": len(frames), "videos": paths, "min_agreement": args.min_agreement,
+                   "max_drift": args.max_drift, "precisions": report}, f, indent=2)
+    print(f"✅ Report saved: {args.out}")
+
+    if failed:
+        print(f"❌ Outside the accuracy guardrails: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import numpy as np
+from bench.synthetic import generate_pair
+
+BENCHES = ("decode", "movenet", "movenet_crop", "ball", "ball_roi", "hsv", "clip", "logger", "db", "e2e")
+MOVENET_MODEL = "models/movenet_thunder_int8.tflite"
+
+
+def peak_rss_mb():
+    # Process high-water mark so far, so per bench it only ever grows (earlier benches'
+    # models stay counted). ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_summary(seconds):
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    if ms.size == 0:
+        return {}
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {"p50": round(float(p50), 3), "p90": round(float(p90), 3), "p99": round(float(p99), 3),
+            "mean": round(float(ms.mean()), 3), "max": round(float(ms.max()), 3)}
+
+
+def timed_calls(fn, items):
+    # Per-item latency of fn(item), plus the wall time of the whole loop
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - started
+
+
+def result(frames, wall, latencies, **extra):
+    return {"frames": frames, "seconds": round(wall, 3), "fps": round(frames / wall, 2) if wall else None,
+            "latency_ms": latency_summary(latencies), **extra}
+
+
+def load_frames(path, limit):
+    from services.video_service import PrefetchingVideoReader
+    frames = []
+    with PrefetchingVideoReader(path) as reader:
+        for frame in reader:
+            frames.append(frame)
+            if len(frames) >= limit:
+                break
+    return frames
+
+
+# ---------------------------------------------------------------------------
+# Benches: each returns a result() dict for one synthetic drill
+# ---------------------------------------------------------------------------
+def bench_decode(coach_path, student_path, frames):
+    from services.video_service import PrefetchingVideoReader
+    latencies = []
+    started = time.perf_counter()
+    with PrefetchingVideoReader(student_path) as reader:
+        for _ in reader:
+            latencies.append(reader.last_decode_seconds)
+    return result(len(latencies), time.perf_counter() - started, latencies)
+
+
+def bench_movenet(coach_path, student_path, frames, movenet_model=MOVENET_MODEL):
+    from services.movenet_service import MoveNetService
+    movenet = MoveNetService(movenet_model)
+    movenet.detect_keypoints(frames[0])  # warm-up
+    latencies, wall = timed_calls(movenet.detect_keypoints, frames)
+    batch_started = time.perf_counter()
+    movenet.detect_keypoints_many(frames)
+    batch_wall = time.perf_counter() - batch_started
+    movenet.close()
+    return result(len(frames), wall, latencies, pool_fps=round(len(frames) / batch_wall, 2),
+                  pool_size=movenet.pool_size, threads=movenet.num_threads)
+
+
+def bench_movenet_crop(coach_path, student_path, frames, movenet_model=MOVENET_MODEL):
+    # Crop-tracking mode: full frame until a torso is found, then a crop around the last pose
+    from services.movenet_service import MoveNetService
+    from services.pose_tracker import PoseTracker
+    movenet = MoveNetService(movenet_model)
+    movenet.detect_keypoints(frames[0])  # warm-up
+    tracker = PoseTracker(movenet, crop=True)
+    cropped = []
+
+    def track(frame):
+        cropped.append(tracker.region is not None)
+        tracker.track(frame)
+    latencies, wall = timed_calls(track, frames)
+    movenet.close()
+    return result(len(frames), wall, latencies, crop_rate=round(float(np.mean(cropped)), 3))
+
+
+def bench_ball(coach_path, student_path, frames, roi=False):
+    from services.ball_tracker import BallTracker
+    tracker = BallTracker(roi=roi)
+    found = []
+    latencies, wall = timed_calls(lambda frame: found.append(tracker.track(frame) is not None), frames)
+    return result(len(frames), wall, latencies, detection_rate=round(float(np.mean(found)), 3))
+
+
+def bench_hsv(coach_path, student_path, frames):
+    from services.opencv_ball_service import OpenCVBallService
+    service = OpenCVBallService()
+    latencies, wall = timed_calls(service.detect_ball, frames)
+    return result(len(frames), wall, latencies)
+
+
+def bench_clip(coach_path, student_path, frames):
+    from services.clip_service import CLIPService
+    clip = CLIPService()
+    batches = [frames[i:i + clip.batch_size] for i in range(0, len(frames), clip.batch_size)]
+    clip.encode_frames(batches[0])  # warm-up
+    latencies, wall = timed_calls(clip.encode_frames, batches)
+    return result(len(frames), wall, latencies, batch_size=clip.batch_size, precision=clip.precision,
+                  latency_unit="batch")
+
+
+def _synthetic_scored(n, seed=0):
+    # Realistic-looking score_drill() output without running the models
+    from utils.scoring import score_drill
+    rng = np.random.default_rng(seed)
+    labels = ["kicking", "dribbling", "standing", "running", "jumping"]
+
+    def stream():
+        keypoints = rng.random((n, 17, 3), dtype=np.float32)
+        clip = rng.standard_normal((n, 512)).astype(np.float32)
+        clip /= np.linalg.norm(clip, axis=1, keepdims=True)
+        return {"keypoints": keypoints, "balls": rng.random((n, 2), dtype=np.float32) * 500,
+                "clip": clip, "clip_logits": rng.random((n, len(labels)), dtype=np.float32),
+                "inferred": np.ones((n, 3), bool)}
+    coach, student = stream(), stream()
+    return score_drill(coach, student, labels), student
+
+
+def bench_logger(coach_path, student_path, frames):
+    from services.video_service import VideoService
+    from utils.benchmark_logger import BenchmarkLogger
+    video = VideoService(student_path)
+    frame_count = video.get_frame_count()
+    video.release()
+    scored, student = _synthetic_scored(frame_count)
+    logger = BenchmarkLogger("bench")
+    stages = {}
+    started = time.perf_counter()
+    for stage, fn in (("log_drill", lambda: logger.log_drill(scored)),
+                      ("save_to_csv", logger.save_to_csv),
+                      ("save_overlay_video", lambda: logger.save_overlay_video(student_path, student["keypoints"]))):
+        start = time.perf_counter()
+        fn()
+        stages[stage] = round((time.perf_counter() - start) * 1000, 3)
+    wall = time.perf_counter() - started
+    return result(len(logger.rows), wall, [], stage_ms=stages)
+
+
+def bench_db(coach_path, student_path, frames, rows=5000):
+    # Only against a stand-in database: BENCH_DATABASE_URL, never the configured DATABASE_URL
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        return {"skipped": "BENCH_DATABASE_URL is not set"}
+    os.environ["DATABASE_URL"] = url
+    from utils.db import DBLogger, close_pool
+
+    drill_id = f"bench-{os.getpid()}"
+    db = DBLogger(flush_size=10 ** 9, flush_interval=10 ** 9)  # flush explicitly below
+    latencies = []
+    started = time.perf_counter()
+    try:
+        for start in range(0, rows, 500):
+            db.insert_performance_many({
+                "drill_id": drill_id, "frame_num": i, "coach_acc": 80.0, "student_acc": 70.0,
+                "clip_label": "kicking vs kicking", "clip_sim": 0.9, "pose_sim": 75.0,
+                "ball1": "(1, 2)", "ball2": "None"
+            } for i in range(start, min(start + 500, rows)))
+            flush_started = time.perf_counter()
+            db.flush()
+            latencies.append(time.perf_counter() - flush_started)
+        wall = time.perf_counter() - started
+        db.cursor.execute("DELETE FROM performance WHERE drill_id = %s", (drill_id,))
+        db.conn.commit()
+    finally:
+        db.close()
+        close_pool()
+    return result(rows, wall, latencies, latency_unit="flush of 500 rows")
+
+
+def bench_e2e(coach_path, student_path, frames):
+    from drill_evaluator import TIMED_STAGES, process_drill
+    started = time.perf_counter()
+    output = process_drill("bench", coach_path, student_path, use_cache=False, charts=False,
+                           include_rows=True, segment_seconds=0, index=False)
+    wall = time.perf_counter() - started
+    rows = output["rows"]
+    stages = {stage: latency_summary([row[f"{stage}_ms"] / 1000 for row in rows if f"{stage}_ms" in row])
+              for stage in TIMED_STAGES + ("draw",)}
+    return result(len(rows), wall, [], stages=stages)
+
+
+def required_models(name, movenet_model):
+    # Model files a bench loads; a missing one skips that bench instead of aborting the run
+    if name in ("movenet", "movenet_crop"):
+        return [movenet_model]
+    if name == "e2e":
+        return [path for path in (os.getenv("MOVENET_MODEL", MOVENET_MODEL), os.getenv("MOVENET_LIGHTNING_MODEL"))
+                if path]
+    return []
+
+
+RUNNERS = {
+    "decode": bench_decode,
+    "movenet": bench_movenet,
+    "movenet_crop": bench_movenet_crop,
+    "ball": bench_ball,
+    "ball_roi": lambda *args: bench_ball(*args, roi=True),
+    "hsv": bench_hsv,
+    "clip": bench_clip,
+    "logger": bench_logger,
+    "db": bench_db,
+    "e2e": bench_e2e,
+}
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+def compare(report, baseline, max_regression=0.10):
+    # A bench regresses when fps drops, or p90 latency grows, by more than max_regression
+    regressions = []
+    for name, current in report["benches"].items():
+        previous = baseline.get("benches", {}).get(name)
+        if not previous or "skipped" in current or "skipped" in previous:
+            continue
+        if previous.get("fps") and current.get("fps"):
+            change = (current["fps"] - previous["fps"]) / previous["fps"]
+            status = "❌" if change < -max_regression else "✅"
+            print(f"{status} {name}: {previous['fps']} → {current['fps']} fps ({change:+.1%})")
+            if status == "❌":
+                regressions.append(f"{name}: fps {change:+.1%}")
+        old_p90 = previous.get("latency_ms", {}).get("p90")
+        new_p90 = current.get("latency_ms", {}).get("p90")
+        if old_p90 and new_p90:
+            change = (new_p90 - old_p90) / old_p90
+            if change > max_regression:
+                print(f"❌ {name}: p90 {old_p90} → {new_p90} ms ({change:+.1%})")
+                regressions.append(f"{name}: p90 latency {change:+.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the drill pipeline on synthetic videos.")
+    parser.add_argument("--benches", default=",".join(BENCHES), help=f"Comma list of: {', '.join(BENCHES)}")
+    parser.add_argument("--resolutions", default="720p", help="Comma list, e.g. 480p,720p,1080p")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Synthetic clip length")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--frames", type=int, default=150, help="Frames per isolated service bench")
+    parser.add_argument("--movenet-model", default=MOVENET_MODEL)
+    parser.add_argument("--out", default="results/bench/report.json")
+    parser.add_argument("--baseline", default="bench/baseline.json", help="Baseline report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="Allowed fractional slowdown")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    args = parser.parse_args()
+
+    benches = [name.strip() for name in args.benches.split(",") if name.strip()]
+    unknown = set(benches) - set(BENCHES)
+    if unknown:
+        parser.error(f"unknown bench(es): {', '.join(sorted(unknown))}")
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "seconds": args.seconds,
+            "fps": args.fps,
+        },
+        "benches": {}
+    }
+
+    for resolution in [r.strip() for r in args.resolutions.split(",") if r.strip()]:
+        coach_path, student_path = generate_pair(seconds=args.seconds, resolution=resolution, fps=args.fps)
+        frames = load_frames(student_path, args.frames)
+        for name in benches:
+            key = f"{name}@{resolution}"
+            print(f"⏱️ {key}")
+            missing = [path for path in required_models(name, args.movenet_model) if not os.path.exists(path)]
+            try:
+                if missing:
+                    outcome = {"skipped": f"missing model: {', '.join(missing)}"}
+                elif name in ("movenet", "movenet_crop"):
+                    outcome = RUNNERS[name](coach_path, student_path, frames, args.movenet_model)
+                else:
+                    outcome = RUNNERS[name](coach_path, student_path, frames)
+            except ImportError as e:
+                outcome = {"skipped": f"missing dependency: {e}"}
+            except (OSError, ValueError, RuntimeError) as e:
+                # Unloadable models/videos (TFLite raises ValueError for bad model files)
+                outcome = {"skipped": f"failed: {type(e).__name__}: {e}"}
+            outcome["peak_rss_mb_cumulative"] = peak_rss_mb()
+            report["benches"][key] = outcome
+            summary = outcome.get("skipped") or f"{outcome['fps']} fps, latency {outcome['latency_ms']}"
+            print(f"   {summary}")
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Report saved: {args.out}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Baseline saved: {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.max_regression:.0%}")
+            return 1
+        print("✅ No regressions against the baseline")
+    else:
+        print(f"ℹ️ No baseline at {args.baseline}; run with --save-baseline to create one")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import os
+import cv2
+import numpy as np
+
+RESOLUTIONS = {
+    "360p": (640, 360),
+    "480p": (854, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+
+def _field(size, seed):
+    # Static pitch background: green grass stripes, touchline, centre circle and fixed noise
+    width, height = size
+    rng = np.random.default_rng(seed)
+    field = np.zeros((height, width, 3), np.uint8)
+    stripe = max(8, width // 12)
+    for i, x in enumerate(range(0, width, stripe)):
+        field[:, x:x + stripe] = (40, 120 + 15 * (i % 2), 40)
+    noise = rng.integers(-12, 13, size=(height, width, 1), dtype=np.int16)
+    field = np.clip(field.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    cv2.line(field, (width // 2, 0), (width // 2, height), (230, 230, 230), max(1, width // 400))
+    cv2.circle(field, (width // 2, height // 2), height // 5, (230, 230, 230), max(1, width // 400))
+    return field
+
+
+def _skeleton(t, size, tempo, amplitude):
+    # Joint positions of a running/kicking stick figure at time t (seconds)
+    width, height = size
+    scale = height / 720
+    phase = 2 * np.pi * tempo * t
+    cx = width * (0.2 + 0.6 * (0.5 + 0.5 * np.sin(0.15 * phase)))
+    hip = np.array([cx, height * 0.62])
+    neck = hip + [4 * scale * np.sin(phase), -150 * scale]
+    swing = amplitude * np.sin(phase)
+    limb = 80 * scale
+
+    def joint(origin, angle, length=limb):
+        return origin + length * np.array([np.sin(angle), np.cos(angle)])
+
+    knees = [joint(hip, swing), joint(hip, -swing)]
+    feet = [joint(knees[0], swing - 0.4 * abs(swing)), joint(knees[1], -swing - 0.4 * abs(swing))]
+    elbows = [joint(neck, -swing * 0.8 + 0.3, limb * 0.8), joint(neck, swing * 0.8 - 0.3, limb * 0.8)]
+    hands = [joint(elbows[0], -swing + 0.6, limb * 0.7), joint(elbows[1], swing - 0.6, limb * 0.7)]
+    head = neck + [0, -35 * scale]
+    return head, neck, hip, knees, feet, elbows, hands, feet[0]
+
+
+def render_frame(field, t, tempo=1.0, amplitude=0.7, jersey=(200, 60, 20)):
+    height, width = field.shape[:2]
+    scale = height / 720
+    frame = field.copy()
+    head, neck, hip, knees, feet, elbows, hands, kicking_foot = _skeleton(t, (width, height), tempo, amplitude)
+
+    thickness = max(2, int(14 * scale))
+    segments = [(neck, hip)] + [(hip, k) for k in knees] + list(zip(knees, feet)) \
+        + [(neck, e) for e in elbows] + list(zip(elbows, hands))
+    for a, b in segments:
+        cv2.line(frame, tuple(int(v) for v in a), tuple(int(v) for v in b), jersey, thickness, cv2.LINE_AA)
+    cv2.circle(frame, tuple(int(v) for v in head), max(4, int(28 * scale)), (150, 180, 220), -1, cv2.LINE_AA)
+
+    # ✅ Ball: follows the kicking foot, then travels and bounces
+    phase = (t * tempo) % 2.0
+    if phase < 1.0:
+        ball = kicking_foot + [18 * scale, 0]
+    else:
+        travel = phase - 1.0
+        ball = kicking_foot + [travel * width * 0.35, -abs(np.sin(travel * 2 * np.pi)) * height * 0.25]
+    ball = (int(np.clip(ball[0], 20, width - 20)), int(np.clip(ball[1], 20, height - 20)))
+    cv2.circle(frame, ball, max(6, int(16 * scale)), (250, 250, 250), -1, cv2.LINE_AA)
+    cv2.circle(frame, ball, max(6, int(16 * scale)), (20, 20, 20), max(1, int(2 * scale)), cv2.LINE_AA)
+    return frame
+
+
+def generate_clip(path, seconds=10.0, resolution="720p", fps=30.0, seed=0, tempo=1.0,
+                  amplitude=0.7, offset=0.0):
+    # ✅ Deterministic synthetic drill clip; same arguments → same frames
+    size = RESOLUTIONS.get(resolution, resolution)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    field = _field(size, seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    if not writer.isOpened():
+        raise IOError(f"❌ Cannot open video writer: {path}")
+    try:
+        for i in range(int(round(seconds * fps))):
+            writer.write(render_frame(field, offset + i / fps, tempo=tempo, amplitude=amplitude))
+    finally:
+        writer.release()
+    return path
+
+
+def generate_pair(out_dir="results/bench/videos", seconds=10.0, resolution="720p", fps=30.0, seed=0):
+    # Coach + student clips of the same drill: the student is slightly slower, starts late and
+    # swings less, so alignment and similarity have real work to do. Reuses existing files.
+    name = f"{resolution}_{int(seconds)}s_{int(fps)}fps_seed{seed}"
+    coach_path = os.path.join(out_dir, f"coach_{name}.mp4")
+    student_path = os.path.join(out_dir, f"student_{name}.mp4")
+    if not os.path.exists(coach_path):
+        generate_clip(coach_path, seconds, resolution, fps, seed=seed)
+    if not os.path.exists(student_path):
+        generate_clip(student_path, seconds, resolution, fps, seed=seed + 1, tempo=0.9,
+                      amplitude=0.55, offset=-0.5)
+    return coach_path, student_path
@@ -1,60 +1,356 @@
-import cv2
+import json
 import numpy as np
 import os
-import pandas as pd
-from services.movenet_service import MoveNetService
-from services.video_service import draw_keypoints
-from services.clip_service import CLIPService
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from services.video_service import FramePairReader, PrefetchingVideoReader, VideoService
 from services.ball_tracker import BallTracker
+from services.model_registry import MOVENET_LIGHTNING_MODEL, MOVENET_MODEL, models
+from services.pose_tracker import POSE_CASCADE_THRESHOLD, POSE_CROP_TRACKING, PoseTracker
+from utils.artifacts import load_drill_artifacts, save_drill_artifacts
 from utils.benchmark_logger import BenchmarkLogger
+from utils.drill_index import DrillIndex
+from utils.feature_cache import FeatureCache, hash_file
+from utils.frame_context import FrameContext
+from utils.metrics import DRILL_FPS, DRILLS_TOTAL, FRAMES_TOTAL, STAGE_SECONDS, FrameTimer, span
+from utils.sampling import STAGES, build_samplers
+from utils.scoring import score_drill
 
 
-# Inside movenet_service.py or wherever the model is loaded:
-movenet = MoveNetService("models/movenet_thunder_int8.tflite")
-clip = CLIPService()
-ball_tracker = BallTracker()
+# MoveNet + CLIP are loaded on first use (services.model_registry), not at import
+coach_cache = FeatureCache()
+# Library of processed coach drills for nearest-neighbour matching of uploads
+drill_index = DrillIndex()
 
-def process_drill(drill_id, coach_path, student_path):
-    cap1 = cv2.VideoCapture(coach_path)
-    cap2 = cv2.VideoCapture(student_path)
+# Bump when the stored coach artifacts change meaning
+COACH_CACHE_VERSION = 2
 
-    logger = BenchmarkLogger(drill_id)
-    frame_num = 0
+# ✅ Long videos are split into segments decoded + inferred in parallel (0 disables)
+SEGMENT_SECONDS = float(os.getenv("SEGMENT_SECONDS", "300"))
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", "0"))  # 0 → one per MoveNet interpreter
+# Frames replayed before each segment so ball tracking and scene sampling start warm
+SEGMENT_WARMUP_FRAMES = int(os.getenv("SEGMENT_WARMUP_FRAMES", "30"))
 
-    while cap1.isOpened() and cap2.isOpened():
-        ret1, frame1 = cap1.read()
-        ret2, frame2 = cap2.read()
+# Frames sampled from an uploaded clip to match it against the drill library
+MATCH_SAMPLE_FRAMES = int(os.getenv("MATCH_SAMPLE_FRAMES", "32"))
 
-        if not ret1 or not ret2:
-            break
+# Per-frame stage timings kept for the benchmark CSV (milliseconds)
+TIMED_STAGES = ("decode", "pose", "ball", "clip")
 
-        # ✅ Detect keypoints
-        coach_kps = movenet.detect_keypoints(frame1)
-        student_kps = movenet.detect_keypoints(frame2)
 
-        # ✅ Draw keypoints
-        frame1 = draw_keypoints(frame1, coach_kps)
-        frame2 = draw_keypoints(frame2, student_kps)
+def _coach_cache_key(coach_path, sampling, coach_hash=None):
+    signature = json.dumps({
+        "version": COACH_CACHE_VERSION,
+        "movenet": MOVENET_MODEL,
+        "movenet_lightning": MOVENET_LIGHTNING_MODEL,
+        "pose_cascade_threshold": POSE_CASCADE_THRESHOLD if MOVENET_LIGHTNING_MODEL else None,
+        "pose_crop": POSE_CROP_TRACKING,
+        "clip": models.get("clip").model_name,
+        "clip_precision": models.get("clip").precision,
+        "labels": models.get("clip").labels,
+        "sampling": {stage: str(spec) for stage, spec in (sampling or {}).items()}
+    }, sort_keys=True)
+    return coach_cache.key(coach_hash or hash_file(coach_path), signature)
+
+
+def make_pose_tracker():
+    # Crop tracking per POSE_CROP_TRACKING; Lightning → Thunder cascade when configured
+    if MOVENET_LIGHTNING_MODEL:
+        return PoseTracker(models.get("movenet_lightning"), fallback=models.get("movenet"))
+    return PoseTracker(models.get("movenet"))
+
+
+def load_coach_reference(coach_hash=None, drill_id=None):
+    # ✅ Coach per-frame artifacts without inference: from the coach cache (content hash,
+    # default sampling) or from a processed drill's stored artifacts
+    if drill_id is not None:
+        coach, _, _ = load_drill_artifacts(drill_id)
+        return coach
+    if not coach_hash:
+        raise ValueError("❌ A coach hash or drill id is required")
+    coach = coach_cache.load(_coach_cache_key(None, None, coach_hash))
+    if coach is None:
+        raise FileNotFoundError(f"No cached coach reference for {coach_hash}")
+    return coach
+
+
+class StreamTrack:
+    # ✅ Per-stream inference: sampling decisions, ball tracker state and per-frame outputs.
+    # Skipped frames carry the last inferred result forward; CLIP keyframes are encoded
+    # in batches of clip.batch_size.
+    # frame_offset: absolute frame number of the first added frame (segments).
+    def __init__(self, sampling=None, frame_offset=0, name="student"):
+        self.frame_offset = frame_offset
+        self.name = name
+        self.timer = FrameTimer(TIMED_STAGES)
+        self.movenet, self.clip = models.get("movenet"), models.get("clip")
+        self.samplers = build_samplers(sampling)
+        self.pose_tracker = make_pose_tracker()
+        self.ball_tracker = BallTracker(roi=True)
+        self.keypoints, self.balls, self.clip_index, self.inferred = [], [], [], []
+        self._kps, self._ball = None, (np.nan, np.nan)
+        self._pending, self._pending_frames, self._embeddings, self._keyframes = [], [], [], 0
+
+    def __len__(self):
+        return len(self.keypoints)
+
+    def add(self, frame, decode_seconds=0.0):
+        # ✅ Derived views (resized, gray, thumbnails, CLIP crop) are computed once per frame
+        # and shared by the samplers and stages; the frame itself is read-only to all of them
+        context = FrameContext(frame)
+        first = not self.keypoints
+        frame_num = self.frame_offset + len(self.keypoints)
+        inferred = [first or self.samplers[stage].should_infer(frame_num, context) for stage in STAGES]
+        run_pose, run_ball, run_clip = inferred
+        self.timer.record("decode", decode_seconds, observe=False)  # observed by the reader thread
 
-        # ✅ Pose similarity (simple Euclidean)
-        pose_sim = np.linalg.norm(np.array(coach_kps) - np.array(student_kps))
+        # ✅ Detect keypoints
+        if run_pose:
+            with self.timer.span("pose"):
+                self._kps = np.asarray(self.pose_tracker.track(context), dtype=np.float32)
 
         # ✅ Ball tracking
-        ball1 = ball_tracker.track(frame1)
-        ball2 = ball_tracker.track(frame2)
+        if run_ball:
+            with self.timer.span("ball"):
+                ball = self.ball_tracker.track(context)
+            self._ball = (np.nan, np.nan) if ball is None else ball
+
+        # ✅ CLIP keyframes, encoded a batch at a time; only the model-sized crop is kept
+        if run_clip:
+            self._pending.append(context.center_square(self.clip.input_resolution))
+            self._pending_frames.append(len(self.keypoints))
+            self._keyframes += 1
+            if len(self._pending) >= self.clip.batch_size:
+                self._flush_clip()
+
+        self.keypoints.append(self._kps)
+        self.balls.append(self._ball)
+        self.clip_index.append(self._keyframes - 1)
+        self.inferred.append(inferred)
+        self.timer.next_frame()
+        FRAMES_TOTAL.inc(stream=self.name)
+
+    def _flush_clip(self):
+        if self._pending:
+            with span("clip"):
+                start = time.perf_counter()
+                self._embeddings.append(self.clip.encode_frames(self._pending)[0])
+            # Batch time is shared evenly by the keyframes in the batch
+            per_frame = (time.perf_counter() - start) / len(self._pending)
+            for frame_index in self._pending_frames:
+                self.timer.record("clip", per_frame, frame_index=frame_index, observe=False)
+            self._pending, self._pending_frames = [], []
+
+    def arrays(self):
+        self._flush_clip()
+        dim = self.clip.label_matrix.shape[1]
+        embeddings = np.concatenate(self._embeddings) if self._embeddings else np.zeros((0, dim), np.float32)
+        embeddings = embeddings[self.clip_index] if self.clip_index else np.zeros((0, dim), np.float32)
+        return {
+            "keypoints": np.asarray(self.keypoints, dtype=np.float32).reshape(-1, 17, 3),
+            "balls": np.asarray(self.balls, dtype=np.float32).reshape(-1, 2),
+            "clip": embeddings.astype(np.float32),
+            "clip_logits": self.clip.label_logits(embeddings).astype(np.float32),
+            "inferred": np.asarray(self.inferred, dtype=bool).reshape(-1, len(STAGES)),
+            "timings": np.asarray(self.timer.array(), dtype=np.float32).reshape(-1, len(TIMED_STAGES))
+        }
+
+
+def plan_segments(frame_count, fps, segment_seconds=SEGMENT_SECONDS):
+    # [(start, end), ...] frame ranges; the last end is None so it reads to the real end of
+    # the stream (CAP_PROP_FRAME_COUNT is only an estimate for some containers)
+    length = int(segment_seconds * (fps or 30.0))
+    if length <= 0 or frame_count < 2 * length:
+        return [(0, None)]
+    count = int(round(frame_count / length))
+    bounds = [i * frame_count // count for i in range(count)]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def _track_segment(video_path, start, end, sampling, name, warmup=SEGMENT_WARMUP_FRAMES, on_frame=None):
+    # Infer frames [start, end) after replaying up to `warmup` earlier frames through the
+    # stateful parts (ball tracker, scene sampler); warm-up outputs are dropped
+    warm_start = max(0, start - warmup)
+    skip = start - warm_start
+    track = StreamTrack(sampling, frame_offset=warm_start, name=name)
+    with PrefetchingVideoReader(video_path, start_frame=warm_start, end_frame=end) as reader:
+        for frame in reader:
+            track.add(frame, reader.last_decode_seconds)
+            if on_frame and len(track) > skip:
+                on_frame()
+    return {name: array[skip:] for name, array in track.arrays().items()}
+
 
-        # ✅ CLIP semantic similarity
-        label1, label2, clip_sim = clip.compare_frames(frame1, frame2)
+def _track_segments(executor, video_path, segments, sampling, name, on_frame=None):
+    # Submit every segment now; the returned callable merges them in order
+    futures = [executor.submit(_track_segment, video_path, start, end, sampling, name, on_frame=on_frame)
+               for start, end in segments]
 
-        # ✅ Store logs
-        logger.log(frame_num, coach_kps, student_kps, pose_sim, ball1, ball2, label1, label2, clip_sim)
+    def merge():
+        parts = [future.result() for future in futures]
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    return merge
 
-        frame_num += 1
 
-    cap1.release()
-    cap2.release()
+def process_drill(drill_id, coach_path, student_path, sampling=None, use_cache=True, progress=None,
+                  coach_hash=None, align=True, charts=True, include_rows=False, segment_seconds=SEGMENT_SECONDS,
+                  prompts=None, index=True):
+    # sampling: per-stage policy specs, e.g. {"clip": "scene:0.08", "ball": "stride:2"}.
+    # progress: optional callback(frames_done, total_frames) invoked after every student frame.
+    # coach_hash: content hash of the coach video when already known (skips re-hashing).
+    # align: pair frames along a banded DTW path instead of by index.
+    # charts: write the summary PNGs (fixed paths, so off when drills run in parallel).
+    # include_rows: also return the per-frame CSV rows.
+    # segment_seconds: split long videos into segments inferred in parallel (0 disables).
+    # prompts: per-drill CLIP label prompts (default: the service's labels).
+    # index: register the coach video in the drill library (keyed by its content hash).
+    started = time.perf_counter()
+    logger = BenchmarkLogger(drill_id)
+    student_track = StreamTrack(sampling)
+    student = None
+
+    # ✅ Coach reference artifacts are cached by video content hash
+    if use_cache or index:
+        coach_hash = coach_hash or hash_file(coach_path)
+    cache_key = _coach_cache_key(coach_path, sampling, coach_hash) if use_cache else None
+    coach = coach_cache.load(cache_key) if cache_key else None
+
+    def add_student(frame, decode_seconds):
+        student_track.add(frame, decode_seconds)
+        if progress:
+            progress(len(student_track), total_frames)
+
+    if coach is not None:
+        print(f"⚡ Coach reference cache hit: {cache_key}")
+
+    student_video = VideoService(student_path)
+    fps, total_frames = student_video.get_fps(), student_video.get_frame_count()
+    student_video.release()
+    student_segments = plan_segments(total_frames, fps, segment_seconds)
+    coach_segments = None
+    if coach is None:
+        coach_video = VideoService(coach_path)
+        coach_segments = plan_segments(coach_video.get_frame_count(), coach_video.get_fps(), segment_seconds)
+        coach_video.release()
+
+    if len(student_segments) > 1 or (coach_segments and len(coach_segments) > 1):
+        # ✅ Long uploads: per-segment inference on a thread pool (MoveNet interpreter pool,
+        # CLIP/OpenCV release the GIL), merged back in frame order
+        done, lock = [0], threading.Lock()
+
+        def student_frame_done():
+            with lock:
+                done[0] += 1
+                if progress:
+                    progress(done[0], total_frames)
+
+        workers = SEGMENT_WORKERS or models.get("movenet").pool_size
+        print(f"⚡ Segment-parallel: {len(student_segments)} student / {len(coach_segments or [])} coach "
+              f"segment(s) on {workers} worker(s)")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="segment") as executor:
+            merge_coach = coach_segments and _track_segments(executor, coach_path, coach_segments, sampling, "coach")
+            merge_student = _track_segments(executor, student_path, student_segments, sampling, "student",
+                                            on_frame=student_frame_done)
+            student = merge_student()
+            if merge_coach:
+                coach = merge_coach()
+    elif coach is not None:
+        with PrefetchingVideoReader(student_path) as reader:
+            for frame in reader:
+                add_student(frame, reader.last_decode_seconds)
+    else:
+        coach_track = StreamTrack(sampling, name="coach")
+        # ✅ Coach + student decoded on background threads, overlapping with inference
+        with FramePairReader(coach_path, student_path) as pairs:
+            for frame1, frame2 in pairs:
+                coach_track.add(frame1, pairs.coach.last_decode_seconds)
+                add_student(frame2, pairs.student.last_decode_seconds)
+
+            # ✅ Whole sequences are needed for alignment and the cache: finish the longer one
+            for frame1 in pairs.coach:
+                coach_track.add(frame1, pairs.coach.last_decode_seconds)
+            for frame2 in pairs.student:
+                add_student(frame2, pairs.student.last_decode_seconds)
+        coach = coach_track.arrays()
+
+    if coach_segments and use_cache and len(coach["keypoints"]):
+        features = {name: array for name, array in coach.items() if name != "timings"}
+        coach_cache.save(cache_key, features, meta={"coach_path": coach_path, "frames": len(coach["keypoints"])})
+        print(f"💾 Coach reference cached: {cache_key}")
+
+    if student is None:
+        student = student_track.arrays()
+
+    # ✅ Custom prompts: relabel from the stored embeddings against the cached prompt matrix
+    clip = models.get("clip")
+    labels = list(prompts) if prompts else clip.labels
+    if prompts:
+        coach = dict(coach, clip_logits=clip.prompt_logits(coach["clip"], labels))
+        student = dict(student, clip_logits=clip.prompt_logits(student["clip"], labels))
+    inference_seconds = time.perf_counter() - started
+
+    # ✅ Coach signature into the drill library (no-op when already indexed)
+    if index and len(coach["clip"]):
+        with span("index"):
+            if drill_index.register(coach_hash, coach["clip"], meta={
+                    "drill_id": str(drill_id), "coach_path": coach_path, "frames": len(coach["clip"])}):
+                print(f"📚 Coach drill indexed: {drill_id}")
+
+    # ✅ Keep raw outputs so the drill can be rescored without inference
+    with span("artifacts"):
+        artifacts_dir = save_drill_artifacts(drill_id, coach, student, meta={
+            "labels": labels,
+            "fps": fps,
+            "coach_path": coach_path,
+            "coach_hash": coach_hash,
+            "student_path": student_path
+        })
+
+    # ✅ Align + score the whole drill in vectorized passes
+    with span("score"):
+        scored = score_drill(coach, student, labels, align=align, fps=fps)
+        logger.log_drill(scored)
 
     # ✅ Save overlay video
-    logger.save_overlay_video()
-    logger.save_to_csv()
-    logger.save_summary_charts()
+    with span("overlay"):
+        overlay_path = logger.save_overlay_video(student_path, student["keypoints"])
+    with span("csv"):
+        csv_path = logger.save_to_csv()
+    with span("charts"):
+        chart_paths = logger.save_summary_charts() if charts else None
+
+    frames = len(student["keypoints"])
+    if inference_seconds > 0:
+        DRILL_FPS.set(round(frames / inference_seconds, 2))
+    DRILLS_TOTAL.inc()
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="drill")
+
+    result = {
+        "frames": len(logger.rows),
+        "csv": csv_path,
+        "overlay_video": overlay_path,
+        "charts": chart_paths or [],
+        "artifacts": artifacts_dir
+    }
+    if include_rows:
+        result["rows"] = logger.rows
+    return result
+
+
+def match_drill(video_path, k=5, frames=MATCH_SAMPLE_FRAMES):
+    # ✅ Top-k coach drills in the library for a clip: CLIP on a few evenly spaced frames,
+    # then one matrix multiply against the drill index
+    video = VideoService(video_path)
+    try:
+        sampled = video.sample_frames(frames)
+    finally:
+        video.release()
+    if not sampled:
+        raise ValueError(f"❌ No frames could be decoded from {video_path}")
+
+    with span("match_encode"):
+        embeddings = models.get("clip").encode_frames(sampled)[0]
+    with span("match_search"):
+        matches = drill_index.search(embeddings, k=k)
+    return {"frames": len(sampled), "matches": matches}
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+import cv2
+import numpy as np
+from drill_evaluator import make_pose_tracker
+from services.ball_tracker import BallTracker
+from services.model_registry import models
+from utils.frame_context import FrameContext
+from utils.metrics import FRAMES_TOTAL, LIVE_FRAMES, STAGE_SECONDS, span
+from utils.similarity import score_pose_sequences
+
+# CLIP label refresh interval, in processed frames (the label is carried forward in between)
+LIVE_CLIP_EVERY = int(os.getenv("LIVE_CLIP_EVERY", "5"))
+# Coach timeline searched ahead of the last matched coach frame, in seconds
+LIVE_ALIGN_SECONDS = float(os.getenv("LIVE_ALIGN_SECONDS", "1.0"))
+# Frames accepted per second (0 = as fast as inference keeps up); extra frames are sampled out
+LIVE_MAX_FPS = float(os.getenv("LIVE_MAX_FPS", "0"))
+
+# Similarity points given up per coach frame away from "one frame ahead" when matching
+TIME_PENALTY = 0.05
+
+JPEG_MAGIC, PNG_MAGIC = b"\xff\xd8", b"\x89PNG\r\n\x1a\n"
+
+
+def decode_frame(data, shape=None):
+    # JPEG/PNG bytes → BGR frame; raw BGR bytes need shape=(height, width) from a config message
+    if data[:2] == JPEG_MAGIC or data[:8] == PNG_MAGIC:
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("❌ Could not decode image frame")
+        return frame
+    if shape is None:
+        raise ValueError("❌ Raw frames need a config message with width and height first")
+    height, width = shape
+    if len(data) != height * width * 3:
+        raise ValueError(f"❌ Raw frame is {len(data)} bytes, expected {height}x{width}x3")
+    return np.frombuffer(data, np.uint8).reshape(height, width, 3)
+
+
+class OnlineAligner:
+    # ✅ Streaming counterpart of the DTW alignment: each student pose is matched to the most
+    # similar coach pose at most `window` frames ahead of the previous match (never backwards)
+    def __init__(self, coach_keypoints, window):
+        self.coach = np.asarray(coach_keypoints, dtype=np.float32)
+        self.window = max(1, int(window))
+        self.position = 0
+
+    def match(self, keypoints):
+        # → (coach frame, pose similarity, coach accuracy, student accuracy)
+        end = min(len(self.coach), self.position + self.window + 1)
+        candidates = self.coach[self.position:end]
+        student = np.repeat(np.asarray(keypoints, dtype=np.float32)[None], len(candidates), axis=0)
+        scores = score_pose_sequences(candidates, student)
+        # Ties (held or low-confidence poses) resolve towards advancing one frame per frame
+        offsets = np.arange(len(candidates))
+        best = int((scores["frame_similarity"] - TIME_PENALTY * np.abs(offsets - 1)).argmax())
+        self.position += best
+        return (self.position, float(scores["frame_similarity"][best]),
+                float(scores["coach_accuracy"][best]), float(scores["student_accuracy"][best]))
+
+
+class LiveSession:
+    # ✅ Per-connection streaming state: pose/ball trackers, online coach alignment and the
+    # last CLIP label. process() handles one student frame.
+    def __init__(self, coach, fps=30.0, prompts=None, clip_every=LIVE_CLIP_EVERY,
+                 align_seconds=LIVE_ALIGN_SECONDS):
+        if not len(coach["keypoints"]):
+            raise ValueError("❌ Coach reference has no frames")
+        self.coach = coach
+        self.clip = models.get("clip")
+        self.pose_tracker = make_pose_tracker()
+        self.ball_tracker = BallTracker(roi=True)
+        self.aligner = OnlineAligner(coach["keypoints"], window=align_seconds * fps)
+        self.clip_every = max(1, clip_every)
+        self.labels = list(prompts) if prompts else self.clip.labels
+        coach_logits = self.clip.prompt_logits(coach["clip"], self.labels) if prompts else coach["clip_logits"]
+        self.coach_labels = np.asarray(coach_logits).argmax(axis=-1)
+        self.frames = 0
+        self.embedding, self.label, self.label_score = None, None, None
+
+    def process(self, frame):
+        context = FrameContext(frame)
+        with span("pose"):
+            keypoints = np.asarray(self.pose_tracker.track(context), dtype=np.float32)
+        with span("ball"):
+            ball = self.ball_tracker.track(context)
+
+        if self.frames % self.clip_every == 0:
+            with span("clip"):
+                embeddings, _ = self.clip.encode_frames([context.center_square(self.clip.input_resolution)])
+                logits = self.clip.prompt_logits(embeddings, self.labels)[0]
+            self.embedding = embeddings[0]
+            self.label, self.label_score = self.labels[int(logits.argmax())], float(logits.max())
+
+        coach_frame, pose_similarity, coach_acc, student_acc = self.aligner.match(keypoints)
+        self.frames += 1
+        FRAMES_TOTAL.inc(stream="live")
+        return {
+            "frame": self.frames - 1,
+            "coach_frame": coach_frame,
+            "pose_similarity": round(pose_similarity, 2),
+            "coach_accuracy": round(coach_acc, 2),
+            "student_accuracy": round(student_acc, 2),
+            "ball": None if ball is None else [int(ball[0]), int(ball[1])],
+            "label": self.label,
+            "label_score": round(self.label_score, 3),
+            "coach_label": self.labels[int(self.coach_labels[coach_frame])],
+            "clip_similarity": round(float(self.embedding @ np.asarray(self.coach["clip"][coach_frame])), 3),
+            "keypoints": np.round(keypoints, 4).tolist()
+        }
+
+
+class LiveStats:
+    # Received / processed / dropped counts, achieved fps and end-to-end latency percentiles
+    def __init__(self, window=100):
+        self.received = self.processed = self.dropped = self.sampled_out = 0
+        self.started = None
+        self.latencies = deque(maxlen=window)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        latencies = np.asarray(self.latencies) * 1000
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "fps": round(self.processed / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {"p50": round(float(np.percentile(latencies, 50)), 1),
+                           "p90": round(float(np.percentile(latencies, 90)), 1)} if latencies.size else {}
+        }
+
+
+async def run_live_session(websocket, session, max_fps=LIVE_MAX_FPS):
+    # ✅ Backpressure: the receiver keeps only the newest unprocessed frame (older ones are
+    # dropped), and frames beyond max_fps are sampled out on arrival, so latency stays
+    # bounded by one inference however fast the client sends.
+    # Client → server: binary JPEG/PNG (or raw BGR after {"type": "config", "width", "height"}),
+    # optional {"type": "frame", "ts": ...} before a frame (echoed back as client_ts),
+    # {"type": "stop"} for a final summary. Server → client: {"type": "result", ...} per processed frame.
+    stats = LiveStats()
+    latest, ready, closed = [None], asyncio.Event(), asyncio.Event()
+    state = {"shape": None, "client_ts": None, "last_accepted": 0.0}
+
+    async def receive():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("text") is not None:
+                    # A malformed control message is reported and skipped, not fatal
+                    try:
+                        control = json.loads(message["text"])
+                        if not isinstance(control, dict):
+                            raise ValueError("expected a JSON object")
+                        if control.get("type") == "config":
+                            state["shape"] = (int(control["height"]), int(control["width"]))
+                    except (ValueError, KeyError, TypeError) as e:
+                        detail = f"❌ Bad control message: {type(e).__name__}: {e}"
+                        await websocket.send_json({"type": "error", "detail": detail})
+                        continue
+                    if control.get("type") == "stop":
+                        break
+                    if control.get("type") == "frame":
+                        state["client_ts"] = control.get("ts")
+                    continue
+
+                received = time.perf_counter()
+                stats.received += 1
+                stats.started = stats.started or received
+                if max_fps and received - state["last_accepted"] < 1.0 / max_fps:
+                    stats.sampled_out += 1
+                    LIVE_FRAMES.inc(outcome="sampled_out")
+                    continue
+                state["last_accepted"] = received
+                if latest[0] is not None:
+                    stats.dropped += 1
+                    LIVE_FRAMES.inc(outcome="dropped")
+                latest[0] = (stats.received - 1, message["bytes"], received, state["client_ts"], state["shape"])
+                state["client_ts"] = None
+                ready.set()
+        finally:
+            closed.set()
+            ready.set()
+
+    def handle(item):
+        seq, data, received, client_ts, shape = item
+        result = session.process(decode_frame(data, shape))
+        latency = time.perf_counter() - received
+        return dict(result, type="result", seq=seq, client_ts=client_ts, latency_ms=round(latency * 1000, 1)), latency
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            if latest[0] is None:
+                if closed.is_set():
+                    break
+                await ready.wait()
+                ready.clear()
+                continue
+            item, latest[0] = latest[0], None
+            try:
+                result, latency = await asyncio.to_thread(handle, item)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "seq": item[0], "detail": str(e)})
+                continue
+            stats.processed += 1
+            stats.latencies.append(latency)
+            LIVE_FRAMES.inc(outcome="processed")
+            STAGE_SECONDS.observe(latency, stage="live_frame")
+            result.update(fps=stats.summary()["fps"], dropped=stats.dropped + stats.sampled_out)
+            await websocket.send_json(result)
+    finally:
+        receiver.cancel()
+    return stats.summary()
@@ -1,142 +1,203 @@
+import argparse
+import csv
+import multiprocessing as mp
 import os
-import cv2
-from services.movenet_service import MoveNetService
-from services.clip_service import CLIPService
-from services.ball_tracker import BallTracker
-from utils.benchmark_logger import BenchmarkLogger
-from utils.db import DBLogger
-
-# ✅ Initialize services
-pose = MoveNetService()
-clip_service = CLIPService()
-benchmark = BenchmarkLogger()
-db_logger = DBLogger()
-ball_tracker = BallTracker()
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
 # ✅ Config
-video_dir = "videos"
-drill_count = 3
-player_id = "player_101"  # You can make this dynamic later
-
-def pose_accuracy(keypoints):
-    return sum(1 for k in keypoints if k[2] > 0.3) / len(keypoints) * 100
-
-# ✅ Loop through drills
-for idx in range(drill_count):
-    drill_id = f"Drill {idx + 1}"
-    coach_path = os.path.join(video_dir, f"coach_drill{idx + 1}.MP4")
-    student_path = os.path.join(video_dir, f"student_drill{idx + 1}.MP4")
-
-    if not os.path.exists(coach_path) or not os.path.exists(student_path):
-        print(f"❌ {drill_id} videos not found.")
-        continue
-
-    print(f"\n🎥 Comparing {drill_id}: Coach vs Student")
-
-    cap1 = cv2.VideoCapture(coach_path)
-    cap2 = cv2.VideoCapture(student_path)
-
-    frame_count = 0
-    coach_acc_list, student_acc_list, pose_sim_list = [], [], []
-
-    while cap1.isOpened() and cap2.isOpened():
-        ret1, frame1 = cap1.read()
-        ret2, frame2 = cap2.read()
-        if not ret1 or not ret2:
-            break
-
-        frame_count += 1
-
-        # ✅ Pose detection
-        coach_kpts = pose.detect(frame1)
-        student_kpts = pose.detect(frame2)
-
-        # ✅ Ball tracking
-        frame1, ball1 = ball_tracker.track_ball(frame1)
-        frame2, ball2 = ball_tracker.track_ball(frame2)
-
-        # ✅ CLIP similarity
-        label1, sim1 = clip_service.compare_frame_to_prompts(
-            frame1, ["dribble", "kick", "run", "stand"]
-        )
-        sim1_score = float(sim1.max().item())
-
-        # ✅ Pose comparison
-        pose_sim = pose.compare_keypoints(coach_kpts, student_kpts)
-        acc1 = pose_accuracy(coach_kpts)
-        acc2 = pose_accuracy(student_kpts)
-
-        coach_acc_list.append(acc1)
-        student_acc_list.append(acc2)
-        pose_sim_list.append(pose_sim)
-
-        # ✅ CSV + DB Logging
-        benchmark.log(
-            drill_id=drill_id,
-            frame_num=frame_count,
-            coach_acc=acc1,
-            student_acc=acc2,
-            clip_label=label1,
-            clip_sim=sim1_score * 100,
-            pose_sim=pose_sim,
-            ball1=ball1,
-            ball2=ball2
-        )
-
-        db_logger.insert_performance(
-            drill_id=drill_id,
-            frame_num=frame_count,
-            coach_acc=acc1,
-            student_acc=acc2,
-            clip_label=label1,
-            clip_sim=sim1_score,
-            pose_sim=pose_sim,
-            ball1=ball1,
-            ball2=ball2
-        )
-
-        # ✅ Show video side-by-side
-        if frame1 is not None and frame2 is not None:
-            if frame1.shape[:2] != frame2.shape[:2]:
-                frame2 = cv2.resize(frame2, (frame1.shape[1], frame1.shape[0]))
-            if frame1.dtype == frame2.dtype:
-                combined = cv2.hconcat([frame1, frame2])
-                cv2.imshow("Coach vs Student", combined)
-
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-
-    cap1.release()
-    cap2.release()
-
-    # ✅ Insert aggregated player performance for this drill
-    print(f"\n🧪 Loop finished for {drill_id}")
-    print(f"coach_acc_list: {len(coach_acc_list)} | student_acc_list: {len(student_acc_list)} | pose_sim_list: {len(pose_sim_list)}")
-
-    if coach_acc_list and student_acc_list and pose_sim_list:
-        coach_avg = sum(coach_acc_list) / len(coach_acc_list)
-        student_avg = sum(student_acc_list) / len(student_acc_list)
-        pose_avg = sum(pose_sim_list) / len(pose_sim_list)
-
-        print(f"📥 Inserting summary for {player_id} - {drill_id}")
-        db_logger.insert_player_performance(
-            player_id=player_id,
-            drill_id=drill_id,
-            coach_avg=coach_avg,
-            student_avg=student_avg,
-            pose_sim_avg=pose_avg
-        )
-    else:
-        print(f"❌ Skipped insert for {drill_id} due to missing data.")
-
-# ✅ Generate report visuals
-plot_paths = benchmark.plot_summary()
-
-print(f"\n✅ Benchmark CSV saved at: {benchmark.filepath}")
-print(f"📊 Accuracy Chart saved at: {plot_paths[0]}")
-print(f"📉 Histogram saved at: {plot_paths[1]}")
-print(f"📌 Confusion Matrix saved at: {plot_paths[2]}")
-
-# ✅ Clean up
-cv2.destroyAllWindows()
-db_logger.close()
+VIDEO_DIR = "videos"
+DRILL_COUNT = 3
+PLAYER_ID = "player_101"
+
+
+def drill_paths(video_dir, number):
+    coach_path = os.path.join(video_dir, f"coach_drill{number}.MP4")
+    student_path = os.path.join(video_dir, f"student_drill{number}.MP4")
+    return coach_path, student_path
+
+
+def parse_drills(specs):
+    # "1 2 5-7" / "1,2,5-7" → [1, 2, 5, 6, 7]
+    numbers = []
+    for spec in specs:
+        for part in spec.split(","):
+            if "-" in part:
+                start, end = part.split("-", 1)
+                numbers.extend(range(int(start), int(end) + 1))
+            elif part.strip():
+                numbers.append(int(part))
+    return list(dict.fromkeys(numbers))
+
+
+# ---------------------------------------------------------------------------
+# Worker side: models are loaded once per process, drills are evaluated one at a time
+# ---------------------------------------------------------------------------
+_process_drill = None
+
+
+def _init_worker(threads_per_worker):
+    global _process_drill
+    # ✅ Split the cores between workers instead of every process grabbing all of them
+    threads = str(threads_per_worker)
+    os.environ["MOVENET_POOL_SIZE"] = "1"
+    os.environ["MOVENET_THREADS"] = threads
+    os.environ["OMP_NUM_THREADS"] = threads
+
+    import cv2
+    import torch
+    cv2.setNumThreads(threads_per_worker)
+    torch.set_num_threads(threads_per_worker)
+
+    from drill_evaluator import process_drill
+    from services.model_registry import models
+    models.warm_up()  # MoveNet + CLIP once per worker, before the first drill
+    _process_drill = process_drill
+    print(f"✅ Worker {os.getpid()} ready ({threads_per_worker} thread(s))")
+
+
+def _evaluate(task):
+    drill_id, coach_path, student_path, prompts = task
+    started = time.perf_counter()
+    try:
+        result = _process_drill(drill_id, coach_path, student_path, charts=False, include_rows=True,
+                                prompts=prompts)
+    except Exception as e:
+        return {"drill_id": drill_id, "error": f"{type(e).__name__}: {e}"}
+    result["drill_id"] = drill_id
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Parent side: one aggregating writer for the squad CSV and the database
+# ---------------------------------------------------------------------------
+class BatchWriter:
+    def __init__(self, player_id, csv_path, use_db=True):
+        self.player_id = player_id
+        self.csv_path = csv_path
+        self.rows = []
+        self._file = None
+        self._writer = None
+        self.db = None
+        if use_db:
+            from utils.db import DBLogger
+            self.db = DBLogger()
+
+    def write(self, result):
+        drill_id, rows = result["drill_id"], result.pop("rows")
+        if not rows:
+            print(f"❌ Skipped {drill_id}: no frames evaluated.")
+            return
+
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.csv_path) or ".", exist_ok=True)
+            self._file = open(self.csv_path, "w", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=["player_id", *rows[0].keys()])
+            self._writer.writeheader()
+        self._writer.writerows({"player_id": self.player_id, **row} for row in rows)
+        self._file.flush()
+        self.rows.extend(rows)
+
+        coach_avg = sum(row["coach_acc"] for row in rows) / len(rows)
+        student_avg = sum(row["student_acc"] for row in rows) / len(rows)
+        pose_avg = sum(row["pose_sim"] for row in rows) / len(rows)
+        print(f"✅ {drill_id}: {len(rows)} frames in {result['seconds']}s | Coach {coach_avg:.2f}% | "
+              f"Student {student_avg:.2f}% | Pose sim {pose_avg:.2f}")
+
+        if self.db is not None:
+            # ✅ Re-evaluation replaces the drill's previous frame rows
+            self.db.replace_performance(drill_id, rows)
+            print(f"📥 Inserting summary for {self.player_id} - {drill_id}")
+            self.db.insert_player_performance(
+                player_id=self.player_id,
+                drill_id=drill_id,
+                coach_avg=coach_avg,
+                student_avg=student_avg,
+                pose_sim_avg=pose_avg
+            )
+            # Existing summaries of a re-evaluated drill are refreshed, not duplicated
+            self.db.refresh_player_summaries(drill_id)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self.db is not None:
+            self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate coach vs student drills in parallel.")
+    parser.add_argument("--drills", nargs="+", default=[f"1-{DRILL_COUNT}"],
+                        help="Drill numbers, e.g. '1 2 5-7' (default: 1-%d)" % DRILL_COUNT)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help="Worker processes (each loads its own models)")
+    parser.add_argument("--player-id", default=PLAYER_ID)
+    parser.add_argument("--video-dir", default=VIDEO_DIR)
+    parser.add_argument("--csv", default=None, help="Aggregated CSV path (default: results/batch_<player>.csv)")
+    parser.add_argument("--no-db", action="store_true", help="Only write the CSV")
+    parser.add_argument("--prompts", nargs="+", default=None,
+                        help="CLIP label prompts for every drill, e.g. --prompts dribbling shooting passing")
+    args = parser.parse_args()
+
+    tasks = []
+    for number in parse_drills(args.drills):
+        drill_id = f"Drill {number}"
+        coach_path, student_path = drill_paths(args.video_dir, number)
+        if not os.path.exists(coach_path) or not os.path.exists(student_path):
+            print(f"❌ {drill_id} videos not found.")
+            continue
+        tasks.append((drill_id, coach_path, student_path, args.prompts))
+    if not tasks:
+        print("⚠️ No drills to evaluate.")
+        return
+
+    # Workers that fail to load their models would otherwise only surface as a broken pool
+    from services.model_registry import model_files
+    missing = [path for path in model_files() if not os.path.exists(path)]
+    if missing:
+        print(f"❌ Model file(s) not found: {', '.join(missing)}")
+        return 1
+
+    workers = max(1, min(args.workers, len(tasks)))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    csv_path = args.csv or f"results/batch_{args.player_id}.csv"
+    writer = BatchWriter(args.player_id, csv_path, use_db=not args.no_db)
+
+    print(f"\n🎥 Evaluating {len(tasks)} drill(s) on {workers} worker(s)")
+    started = time.perf_counter()
+    failed = 0
+    # ✅ spawn: TFLite/torch thread pools do not survive fork. Unlike mp.Pool, the executor
+    # stops with BrokenProcessPool when a worker dies (e.g. _init_worker raising) instead of
+    # respawning it forever
+    with ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"), initializer=_init_worker,
+                             initargs=(threads_per_worker,)) as pool:
+        try:
+            for future in as_completed([pool.submit(_evaluate, task) for task in tasks]):
+                result = future.result()
+                if "error" in result:
+                    failed += 1
+                    print(f"❌ {result['drill_id']} failed: {result['error']}")
+                    continue
+                writer.write(result)
+        except BrokenProcessPool as e:
+            print(f"❌ Worker pool failed (see worker errors above): {e}")
+            return 1
+        finally:
+            writer.close()
+
+    if writer.rows:
+        # ✅ Summary charts once, over every evaluated drill
+        from utils.benchmark_logger import BenchmarkLogger
+        summary = BenchmarkLogger(f"batch_{args.player_id}")
+        summary.rows = writer.rows
+        summary.save_summary_charts()
+        print(f"\n✅ Benchmark CSV saved at: {csv_path}")
+
+    print(f"⏱️ {len(tasks) - failed}/{len(tasks)} drill(s) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import argparse
+from utils.artifacts import list_drill_artifacts
+from utils.scoring import rescore_drill
+from utils.similarity import CONFIDENCE_THRESHOLD
+
+
+def main():
+    # ✅ Re-run scoring (threshold, alignment, similarity) on stored drill artifacts, no inference
+    parser = argparse.ArgumentParser(description="Rescore processed drills from stored artifacts.")
+    parser.add_argument("--drill", action="append", default=[], help="Drill id, e.g. 'Drill 1' (repeatable)")
+    parser.add_argument("--all", action="store_true", help="Rescore every drill with stored artifacts")
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD, help="Keypoint confidence threshold")
+    parser.add_argument("--no-align", action="store_true", help="Pair frames by index instead of DTW alignment")
+    parser.add_argument("--db", action="store_true", help="Replace the drill's performance rows in the database")
+    parser.add_argument("--overlay", action="store_true", help="Re-render the overlay video")
+    parser.add_argument("--prompts", nargs="+", default=None, help="Relabel with these CLIP prompts")
+    args = parser.parse_args()
+
+    drills = list_drill_artifacts() if args.all else args.drill
+    if not drills:
+        parser.error("pass --drill or --all")
+
+    for drill_id in drills:
+        try:
+            result = rescore_drill(drill_id, threshold=args.threshold, align=not args.no_align,
+                                   write_db=args.db, overlay=args.overlay, prompts=args.prompts)
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+            continue
+        print(f"✅ {drill_id}: {result['frames']} frames | Coach {result['coach_avg']}% | "
+              f"Student {result['student_avg']}% | Pose sim {result['pose_avg']}")
+
+
+if __name__ == "__main__":
+    main()
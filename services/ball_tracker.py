@@ -1,8 +1,14 @@
 import cv2
 import numpy as np
+from services.opencv_ball_service import OpenCVBallService
+from utils.frame_context import as_context
 
 class BallTracker:
-    def __init__(self):
+    # roi=True keeps per-stream state: a constant-velocity Kalman filter predicts the
+    # ball and detection runs only on a downscaled window around the prediction,
+    # falling back to the full frame after max_misses consecutive misses.
+    # Use one instance per video stream.
+    def __init__(self, roi=False, window=160, roi_scale=0.5, max_misses=3, detector="hough"):
         self.dp = 1.2
         self.min_dist = 40
         self.param1 = 100
@@ -10,31 +16,113 @@ class BallTracker:
         self.min_radius = 5
         self.max_radius = 60
 
-    def track(self, frame, debug=False):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (9, 9), 2)
+        if detector not in ("hough", "hsv"):
+            raise ValueError(f"❌ Unknown ball detector: {detector}")
+        self.roi = roi
+        self.window = window
+        self.roi_scale = roi_scale
+        self.max_misses = max_misses
+        self.detector = detector
+        self.hsv_service = OpenCVBallService() if detector == "hsv" else None
+        self.reset()
+
+    def reset(self):
+        self.kalman = None
+        self.last_position = None
+        self.misses = 0
+
+    def _init_kalman(self, x, y):
+        # State [x, y, vx, vy], measurement [x, y]
+        kalman = cv2.KalmanFilter(4, 2)
+        kalman.transitionMatrix = np.array(
+            [[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], np.float32)
+        kalman.measurementMatrix = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], np.float32)
+        kalman.processNoiseCov = np.eye(4, dtype=np.float32) * 1e-2
+        kalman.measurementNoiseCov = np.eye(2, dtype=np.float32) * 1.0
+        kalman.errorCovPost = np.eye(4, dtype=np.float32)
+        kalman.statePost = np.array([[x], [y], [0], [0]], np.float32)
+        self.kalman = kalman
 
+    def _hough(self, gray, scale=1.0):
+        blurred = cv2.GaussianBlur(gray, (9, 9), 2) if scale == 1.0 else cv2.GaussianBlur(gray, (5, 5), 1)
         circles = cv2.HoughCircles(
             blurred,
             cv2.HOUGH_GRADIENT,
             dp=self.dp,
-            minDist=self.min_dist,
+            minDist=max(1, int(self.min_dist * scale)),
             param1=self.param1,
             param2=self.param2,
-            minRadius=self.min_radius,
-            maxRadius=self.max_radius
+            minRadius=max(1, int(self.min_radius * scale)),
+            maxRadius=max(2, int(self.max_radius * scale))
         )
+        if circles is None:
+            return [], blurred
+        return [(x / scale, y / scale) for x, y, _ in circles[0, :]], blurred
+
+    def _detect(self, frame, scale=1.0, gray=None):
+        # Candidate centres in `frame` coordinates; `gray` is a precomputed grayscale of `frame`
+        if self.detector == "hsv":
+            if scale != 1.0:
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            ball = self.hsv_service.detect_ball(frame)
+            candidates = [(ball["x"] / scale, ball["y"] / scale)] if ball["found"] else []
+            return candidates, frame
+
+        if gray is None:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale != 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return self._hough(gray, scale)
+
+    def _search_roi(self, context, prediction):
+        h, w = context.shape[:2]
+        px, py = prediction
+        x0, y0 = max(0, int(px - self.window)), max(0, int(py - self.window))
+        x1, y1 = min(w, int(px + self.window)), min(h, int(py + self.window))
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return [], None
 
+        # Reuse the full-frame grayscale if another stage already made it, else convert the window only
+        gray = context.cached("gray")
+        window_gray = None if gray is None else gray[y0:y1, x0:x1]
+        candidates, debug_view = self._detect(context.bgr[y0:y1, x0:x1], self.roi_scale, window_gray)
+        return [(x + x0, y + y0) for x, y in candidates], debug_view
+
+    def track(self, frame, debug=False):
+        # frame: BGR array or utils.frame_context.FrameContext
+        context = as_context(frame)
+        prediction = None
+        if self.roi and self.kalman is not None and self.misses < self.max_misses:
+            predicted = self.kalman.predict()
+            prediction = (float(predicted[0, 0]), float(predicted[1, 0]))
+            candidates, debug_view = self._search_roi(context, prediction)
+        else:
+            gray = context.gray if self.detector == "hough" else None
+            candidates, debug_view = self._detect(context.bgr, gray=gray)
+
+        # ✅ Prefer the circle closest to where we expect the ball
+        reference = prediction or (self.last_position if self.roi else None)
         ball_position = None
-        if circles is not None:
-            circles = np.round(circles[0, :]).astype("int")
-            for (x, y, r) in circles:
-                ball_position = (x, y)
-                # Optional drawing inside processing pipeline
-                break
-
-        if debug:
-            cv2.imshow("Ball Detection Debug", blurred)
+        if candidates:
+            if reference is not None:
+                x, y = min(candidates, key=lambda c: (c[0] - reference[0]) ** 2 + (c[1] - reference[1]) ** 2)
+            else:
+                x, y = candidates[0]
+            ball_position = (int(round(x)), int(round(y)))
+
+        if self.roi:
+            if ball_position is not None:
+                if self.kalman is None or self.misses >= self.max_misses:
+                    self._init_kalman(*ball_position)
+                else:
+                    self.kalman.correct(np.array([[ball_position[0]], [ball_position[1]]], np.float32))
+                self.last_position = ball_position
+                self.misses = 0
+            else:
+                self.misses += 1
+
+        if debug and debug_view is not None:
+            cv2.imshow("Ball Detection Debug", debug_view)
             cv2.waitKey(1)
 
         return ball_position
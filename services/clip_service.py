@@ -1,20 +1,67 @@
+import os
+from contextlib import nullcontext
 import torch
 import clip
 from PIL import Image
 import numpy as np
 import cv2
+from utils.frame_context import FrameContext
+from utils.text_embedding_cache import TextEmbeddingCache
+
+# CLIP normalisation constants (same values as clip.load()'s preprocess)
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+# Image encoder precision on CPU: "fp32", "int8" (dynamic int8 Linear layers) or "bf16" (autocast).
+# Check accuracy on your footage first: python -m bench.clip_precision --video <clip>
+CLIP_PRECISION = os.getenv("CLIP_PRECISION", "fp32")
+PRECISIONS = ("fp32", "int8", "bf16")
+
 
 class CLIPService:
-    def __init__(self, device="cpu"):
+    def __init__(self, device="cpu", batch_size=16, model_name="ViT-B/32", text_cache=None,
+                 precision=CLIP_PRECISION):
+        if precision not in PRECISIONS:
+            raise ValueError(f"❌ Unknown CLIP precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+        if precision != "fp32" and device != "cpu":
+            raise ValueError(f"❌ CLIP precision '{precision}' is a CPU mode")
         self.device = device
-        self.model, self.preprocess = clip.load("ViT-B/32", device=self.device)
+        self.batch_size = batch_size
+        self.model_name = model_name
+        self.precision = precision
+        self.model, self.preprocess = clip.load(model_name, device=self.device)
+        self.model.eval()
+        if precision == "int8":
+            # ✅ Only the image encoder runs per frame; text embeddings stay fp32 (and cached)
+            self.model.visual = torch.ao.quantization.quantize_dynamic(
+                self.model.visual, {torch.nn.Linear}, dtype=torch.qint8)
+        self.input_resolution = self.model.visual.input_resolution
+        self.dtype = self.model.visual.conv1.weight.dtype
         self.labels = ["kicking", "dribbling", "standing", "running", "jumping"]
 
-        # Preprocess labels
-        with torch.no_grad():
-            self.label_tokens = clip.tokenize(self.labels).to(self.device)
-            self.label_features = self.model.encode_text(self.label_tokens)
-            self.label_features /= self.label_features.norm(dim=-1, keepdim=True)
+        self.mean = torch.tensor(CLIP_MEAN, device=self.device).view(1, 3, 1, 1)
+        self.std = torch.tensor(CLIP_STD, device=self.device).view(1, 3, 1, 1)
+
+        # ✅ Prompt embeddings are encoded once per (model, prompt) and cached
+        self.text_cache = text_cache or TextEmbeddingCache()
+        self.label_matrix = self.text_features(self.labels)
+        self.label_features = torch.from_numpy(self.label_matrix).to(self.device)
+
+    def text_features(self, prompts):
+        # Normalized [len(prompts), D] float32 matrix; only uncached prompts hit the text encoder
+        prompts = list(prompts)
+        if not prompts:
+            raise ValueError("❌ At least one prompt is required")
+        found = self.text_cache.get_many(self.model_name, prompts)
+        missing = [prompt for prompt in dict.fromkeys(prompts) if prompt not in found]
+        if missing:
+            with torch.no_grad():
+                tokens = clip.tokenize(missing).to(self.device)
+                features = self.model.encode_text(tokens).float()
+                features /= features.norm(dim=-1, keepdim=True)
+            for prompt, vector in zip(missing, features.cpu().numpy()):
+                found[prompt] = self.text_cache.put(self.model_name, prompt, vector)
+        return np.stack([found[prompt] for prompt in prompts])
 
     def preprocess_frame(self, frame):
         # Convert frame (OpenCV) to PIL format and apply CLIP preprocessing
@@ -22,25 +69,92 @@ class CLIPService:
         pil_img = Image.fromarray(img)
         return self.preprocess(pil_img).unsqueeze(0).to(self.device)
 
-    def compare_frames(self, frame1, frame2):
+    def _center_square(self, frame):
+        # Center crop to a square, then resize to the model input (crop-then-resize
+        # keeps the same field of view as CLIP's Resize + CenterCrop)
+        n = self.input_resolution
+        if isinstance(frame, FrameContext):
+            return frame.center_square(n)
+        if frame.shape[:2] == (n, n):
+            return frame  # already a model-sized crop
+        return FrameContext(frame).center_square(n)
+
+    def preprocess_batch(self, frames):
+        # ✅ Vectorized preprocessing: uint8 BGR frames (or FrameContexts / n x n crops)
+        # → normalized [N, 3, n, n] tensor
+        crops = np.stack([self._center_square(frame) for frame in frames])
+        batch = torch.from_numpy(crops).to(self.device)
+        batch = batch[..., [2, 1, 0]].permute(0, 3, 1, 2).float().div_(255.0)
+        batch = (batch - self.mean) / self.std
+        return batch.to(self.dtype)
+
+    def _image_autocast(self):
+        # bf16 matmuls/convs for the image encoder, weights kept in fp32
+        if self.precision == "bf16":
+            return torch.autocast("cpu", dtype=torch.bfloat16)
+        return nullcontext()
+
+    def _encode_batch(self, frames):
         with torch.no_grad():
-            f1 = self.preprocess_frame(frame1)
-            f2 = self.preprocess_frame(frame2)
+            images = self.preprocess_batch(frames)
+            with self._image_autocast():
+                features = self.model.encode_image(images)
+            features = features.float()
+            features /= features.norm(dim=-1, keepdim=True)
+            logits = features @ self.label_features.float().T
+        return features.cpu().numpy(), logits.cpu().numpy()
+
+    def iter_encode_frames(self, frames, batch_size=None):
+        # ✅ Encode a stream of frames, one forward pass per batch
+        batch_size = batch_size or self.batch_size
+        batch = []
+        for frame in frames:
+            batch.append(frame)
+            if len(batch) == batch_size:
+                yield self._encode_batch(batch)
+                batch = []
+        if batch:
+            yield self._encode_batch(batch)
+
+    def encode_frames(self, frames, batch_size=None):
+        # Returns (embeddings [N, D], label_logits [N, len(labels)]) as float32 arrays
+        embeddings, logits = [], []
+        for batch_embeddings, batch_logits in self.iter_encode_frames(frames, batch_size):
+            embeddings.append(batch_embeddings)
+            logits.append(batch_logits)
 
-            feat1 = self.model.encode_image(f1)
-            feat2 = self.model.encode_image(f2)
+        if not embeddings:
+            dim = self.label_features.shape[-1]
+            return np.zeros((0, dim), np.float32), np.zeros((0, len(self.labels)), np.float32)
+        return np.concatenate(embeddings), np.concatenate(logits)
 
-            feat1 /= feat1.norm(dim=-1, keepdim=True)
-            feat2 /= feat2.norm(dim=-1, keepdim=True)
+    def label_logits(self, embeddings):
+        # Label logits for already-normalized (e.g. cached) embeddings
+        return np.asarray(embeddings, dtype=np.float32) @ self.label_matrix.T
 
-            # Cosine similarity
-            similarity = (feat1 @ feat2.T).item()
+    def prompt_logits(self, embeddings, prompts):
+        # Same as label_logits against an arbitrary prompt set: one matrix multiply
+        return np.asarray(embeddings, dtype=np.float32) @ self.text_features(prompts).T
+
+    def labels_from_logits(self, logits, labels=None):
+        labels = labels or self.labels
+        return [labels[i] for i in np.asarray(logits).argmax(axis=-1)]
+
+    def compare_frame_to_prompts(self, frame, prompts):
+        # (best prompt, cosine similarity to every prompt) for a single frame
+        prompts = list(prompts)
+        embeddings, _ = self._encode_batch([frame])
+        similarities = self.prompt_logits(embeddings, prompts)[0]
+        return prompts[int(similarities.argmax())], similarities
+
+    def compare_frames(self, frame1, frame2):
+        # Both frames go through a single forward pass
+        (feat1, feat2), logits = self._encode_batch([frame1, frame2])
 
-            # Predict action label
-            label_logits1 = feat1 @ self.label_features.T
-            label_logits2 = feat2 @ self.label_features.T
+        # Cosine similarity
+        similarity = float(feat1 @ feat2)
 
-            label1 = self.labels[label_logits1.argmax().item()]
-            label2 = self.labels[label_logits2.argmax().item()]
+        # Predict action label
+        label1, label2 = self.labels_from_logits(logits)
 
         return label1, label2, round(similarity, 3)
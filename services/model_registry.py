@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+
+MOVENET_MODEL = os.getenv("MOVENET_MODEL", "models/movenet_thunder_int8.tflite")
+# Optional cheap first stage (e.g. models/movenet_lightning_int8.tflite); MOVENET_MODEL then
+# only runs when its confidence is low (services.pose_tracker)
+MOVENET_LIGHTNING_MODEL = os.getenv("MOVENET_LIGHTNING_MODEL", "")
+# Comma list of models to load at startup ("movenet,clip" or "all"); empty = load on first use
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "")
+
+
+class ModelRegistry:
+    # ✅ Lazily built, process-wide model singletons. Factories run on first get(), once,
+    # even under concurrent callers; heavy imports (tensorflow, torch, clip) live inside
+    # the factories so importing this module stays cheap.
+    def __init__(self):
+        self.factories = {}
+        self.instances = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self.lock:
+            self.factories[name] = factory
+            self.locks[name] = threading.Lock()
+
+    def get(self, name):
+        instance = self.instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self.factories:
+            raise KeyError(f"❌ Unknown model: {name}")
+        with self.locks[name]:
+            if name not in self.instances:
+                started = time.perf_counter()
+                self.instances[name] = self.factories[name]()
+                print(f"✅ Model '{name}' loaded in {time.perf_counter() - started:.1f}s")
+        return self.instances[name]
+
+    def loaded(self, name):
+        return name in self.instances
+
+    def warm_up(self, names=None):
+        # Load the given models now (default: every registered model)
+        names = list(self.factories) if names is None else names
+        for name in names:
+            self.get(name)
+        return names
+
+
+def _movenet():
+    from services.movenet_service import MoveNetService
+    return MoveNetService(MOVENET_MODEL)
+
+
+def _movenet_lightning():
+    from services.movenet_service import MoveNetService
+    return MoveNetService(MOVENET_LIGHTNING_MODEL)
+
+
+def _clip():
+    from services.clip_service import CLIPService
+    return CLIPService()
+
+
+models = ModelRegistry()
+models.register("movenet", _movenet)
+models.register("clip", _clip)
+if MOVENET_LIGHTNING_MODEL:
+    models.register("movenet_lightning", _movenet_lightning)
+
+
+def model_files():
+    # Model files the registered MoveNet factories load
+    return [path for path in (MOVENET_MODEL, MOVENET_LIGHTNING_MODEL) if path]
+
+
+def warmup_names(spec=WARMUP_MODELS):
+    # "movenet, clip" → ["movenet", "clip"]; "all" → every registered model; "" → []
+    names = [name.strip() for name in (spec or "").split(",") if name.strip()]
+    return list(models.factories) if "all" in names else names
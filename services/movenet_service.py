@@ -1,30 +1,110 @@
 import numpy as np
 import cv2
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from utils.frame_context import as_context
+
+# Interpreters in the pool (concurrent invokes) and TFLite threads per interpreter
+MOVENET_POOL_SIZE = int(os.getenv("MOVENET_POOL_SIZE", "2"))
+MOVENET_THREADS = int(os.getenv("MOVENET_THREADS", "0"))  # 0 → cpu_count / pool size
+# XNNPACK is TFLite's default CPU delegate; set to 0 to run the builtin kernels only
+MOVENET_XNNPACK = os.getenv("MOVENET_XNNPACK", "1") != "0"
+
 
 class MoveNetService:
-    def __init__(self, model_path):
+    def __init__(self, model_path, pool_size=MOVENET_POOL_SIZE, num_threads=MOVENET_THREADS,
+                 use_xnnpack=MOVENET_XNNPACK):
         import tensorflow as tf
-        self.interpreter = tf.lite.Interpreter(model_path=model_path)
-        self.interpreter.allocate_tensors()
-        self.input_details = self.interpreter.get_input_details()
-        self.output_details = self.interpreter.get_output_details()
+        self.model_path = model_path
+        self.pool_size = max(1, int(pool_size))
+        self.num_threads = int(num_threads) or max(1, (os.cpu_count() or 1) // self.pool_size)
+        self.use_xnnpack = use_xnnpack
 
-    def detect_keypoints(self, frame):
-        # Resize and normalize frame
+        resolver = tf.lite.experimental.OpResolverType
+        op_resolver_type = resolver.AUTO if use_xnnpack else resolver.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+
+        # ✅ One interpreter per concurrent caller; set_tensor/invoke are not thread-safe
+        self._pool = queue.Queue()
+        for _ in range(self.pool_size):
+            interpreter = tf.lite.Interpreter(
+                model_path=model_path,
+                num_threads=self.num_threads,
+                experimental_op_resolver_type=op_resolver_type
+            )
+            interpreter.allocate_tensors()
+            self._pool.put(interpreter)
+
+        self.input_details = interpreter.get_input_details()
+        self.output_details = interpreter.get_output_details()
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="movenet")
+        print(f"✅ MoveNet loaded: {self.pool_size} interpreter(s) x {self.num_threads} thread(s), "
+              f"XNNPACK {'on' if use_xnnpack else 'off'}")
+
+    @contextmanager
+    def _checkout(self):
+        interpreter = self._pool.get()
+        try:
+            yield interpreter
+        finally:
+            self._pool.put(interpreter)
+
+    @property
+    def input_size(self):
+        # (width, height) of the model input
         input_shape = self.input_details[0]['shape']
-        h, w = input_shape[1], input_shape[2]
-        resized = cv2.resize(frame, (w, h))
+        return int(input_shape[2]), int(input_shape[1])
 
+    def _to_input(self, image):
         if self.input_details[0]['dtype'] == np.uint8:
-            input_tensor = np.expand_dims(resized, axis=0).astype(np.uint8)
-        else:
-            input_tensor = np.expand_dims(resized / 255.0, axis=0).astype(np.float32)
+            return image[None]  # set_tensor copies, no extra cast/copy needed
+        return (image[None] / np.float32(255.0)).astype(np.float32, copy=False)
 
-        self.interpreter.set_tensor(self.input_details[0]['index'], input_tensor)
-        self.interpreter.invoke()
+    def _prepare(self, frame):
+        # Resize (shared FrameContext view) and normalize frame
+        return self._to_input(as_context(frame).resized(self.input_size))
 
-        # Output: [1, 1, 17, 3] → squeeze to [17, 3]
-        keypoints_with_scores = self.interpreter.get_tensor(self.output_details[0]['index'])
-        keypoints = keypoints_with_scores[0][0]  # shape: [17, 3]
+    def _invoke(self, input_tensor):
+        with self._checkout() as interpreter:
+            interpreter.set_tensor(self.input_details[0]['index'], input_tensor)
+            interpreter.invoke()
 
+            # Output: [1, 1, 17, 3] → squeeze to [17, 3]
+            keypoints_with_scores = interpreter.get_tensor(self.output_details[0]['index'])
+            return keypoints_with_scores[0][0].copy()  # shape: [17, 3]
+
+    def detect_keypoints(self, frame):
+        # frame: BGR array or utils.frame_context.FrameContext
+        keypoints = self._invoke(self._prepare(frame))
         return keypoints.tolist()  # [ [y, x, score], ..., ]
+
+    def detect_keypoints_region(self, frame, region):
+        # ✅ Run the model on a square pixel region (x0, y0, size) of the frame; the region may
+        # extend past the borders (zero padded). Keypoints come back in frame-normalized
+        # (y, x, score), like detect_keypoints.
+        image = as_context(frame).bgr
+        height, width = image.shape[:2]
+        x0, y0, size = region
+        model_w, model_h = self.input_size
+
+        # Crop + pad + resize in a single affine warp
+        scale_x, scale_y = model_w / size, model_h / size
+        matrix = np.float32([[scale_x, 0, -x0 * scale_x], [0, scale_y, -y0 * scale_y]])
+        crop = cv2.warpAffine(image, matrix, (model_w, model_h), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        keypoints = self._invoke(self._to_input(crop))
+
+        keypoints[:, 0] = np.clip((y0 + keypoints[:, 0] * size) / height, 0.0, 1.0)
+        keypoints[:, 1] = np.clip((x0 + keypoints[:, 1] * size) / width, 0.0, 1.0)
+        return keypoints.tolist()
+
+    def detect_keypoints_many(self, frames):
+        # ✅ Fan frames across the interpreter pool (invoke releases the GIL); results keep input order
+        frames = list(frames)
+        if len(frames) <= 1 or self.pool_size == 1:
+            return [self.detect_keypoints(frame) for frame in frames]
+        return list(self._executor.map(self.detect_keypoints, frames))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,78 @@
+import os
+import numpy as np
+from utils.frame_context import as_context
+from utils.metrics import POSE_RUNS
+
+# ✅ Run MoveNet on a crop around the previous frame's pose instead of the squashed full frame
+POSE_CROP_TRACKING = os.getenv("POSE_CROP_TRACKING", "0") != "0"
+# Cascade: the cheap model's result is kept unless its mean keypoint confidence is below this
+POSE_CASCADE_THRESHOLD = float(os.getenv("POSE_CASCADE_THRESHOLD", "0.3"))
+
+# Keypoints trusted when placing the next crop
+MIN_CROP_KEYPOINT_SCORE = 0.2
+# MoveNet keypoint order
+LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP = 5, 6, 11, 12
+TORSO = [LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP]
+
+
+def full_region(width, height):
+    # Square (x0, y0, size) covering the whole frame, centred, padded on the short side
+    size = max(width, height)
+    return ((width - size) / 2, (height - size) / 2, size)
+
+
+def crop_region(keypoints, width, height):
+    # Square pixel region around a confident pose (hips centre, sized by torso and body
+    # extent, as in the MoveNet cropping recipe); None → full frame (torso not visible, or
+    # the crop would cover the whole frame anyway)
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    y, x, score = keypoints[:, 0] * height, keypoints[:, 1] * width, keypoints[:, 2]
+    confident = score > MIN_CROP_KEYPOINT_SCORE
+    if not (confident[[LEFT_HIP, RIGHT_HIP]].any() and confident[[LEFT_SHOULDER, RIGHT_SHOULDER]].any()):
+        return None
+
+    center_y = (y[LEFT_HIP] + y[RIGHT_HIP]) / 2
+    center_x = (x[LEFT_HIP] + x[RIGHT_HIP]) / 2
+    extent = np.maximum(np.abs(y - center_y), np.abs(x - center_x))
+    torso = np.zeros_like(confident)
+    torso[TORSO] = confident[TORSO]
+    half = max(extent[torso].max(initial=0) * 1.9, extent[confident].max(initial=0) * 1.2)
+
+    # No larger than needed to reach the farthest frame edge
+    half = min(half, max(center_x, width - center_x, center_y, height - center_y))
+    if half <= 1 or 2 * half >= max(width, height):
+        return None
+    return (float(center_x - half), float(center_y - half), float(2 * half))
+
+
+class PoseTracker:
+    # ✅ Per-stream MoveNet. crop=True: infer on a square crop derived from the previous
+    # frame's keypoints (full frame until a torso is found). fallback: a second, stronger
+    # model (Thunder) run only when `movenet` (e.g. Lightning) is not confident enough.
+    def __init__(self, movenet, fallback=None, crop=POSE_CROP_TRACKING,
+                 cascade_threshold=POSE_CASCADE_THRESHOLD):
+        self.movenet = movenet
+        self.fallback = fallback
+        self.crop = crop
+        self.cascade_threshold = cascade_threshold
+        self.region = None
+
+    def _detect(self, model, context, region, role):
+        POSE_RUNS.inc(model=role, region="crop" if self.region is not None else "full")
+        if region is None:
+            return model.detect_keypoints(context)
+        return model.detect_keypoints_region(context, region)
+
+    def track(self, frame):
+        # frame: BGR array or FrameContext → [17, 3] (y, x, score), frame-normalized
+        context = as_context(frame)
+        height, width = context.bgr.shape[:2]
+        region = (self.region or full_region(width, height)) if self.crop else None
+
+        keypoints = self._detect(self.movenet, context, region, "primary")
+        if self.fallback is not None and np.mean(np.asarray(keypoints)[:, 2]) < self.cascade_threshold:
+            keypoints = self._detect(self.fallback, context, region, "fallback")
+
+        if self.crop:
+            self.region = crop_region(keypoints, width, height)
+        return keypoints
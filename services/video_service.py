@@ -1,4 +1,12 @@
 import cv2
+import numpy as np
+import queue
+import threading
+import time
+from utils.metrics import STAGE_SECONDS
+
+_END_OF_STREAM = object()
+
 
 class VideoService:
     def __init__(self, video_path):
@@ -13,6 +21,9 @@ class VideoService:
     def rewind(self):
         self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
 
+    def seek(self, frame_num):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+
     def get_frame_count(self):
         return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
@@ -24,10 +35,207 @@ class VideoService:
         height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         return width, height
 
+    def sample_frames(self, count):
+        # Up to `count` frames spread evenly over the video; skipped frames are grabbed
+        # without decoding them to BGR
+        total = self.get_frame_count()
+        wanted = set(np.linspace(0, max(total - 1, 0), num=min(count, max(total, 1))).astype(int).tolist())
+        frames = []
+        for frame_num in range(max(wanted) + 1):
+            if not self.cap.grab():
+                break
+            if frame_num in wanted:
+                ret, frame = self.cap.retrieve()
+                if ret:
+                    frames.append(frame)
+        return frames
+
     def release(self):
         self.cap.release()
 
 
+# ✅ Decodes a video on a background thread into a bounded queue of frames.
+# start_frame/end_frame restrict decoding to [start_frame, end_frame) (end_frame=None → to the end).
+class PrefetchingVideoReader:
+    def __init__(self, video_path, queue_size=8, start_frame=0, end_frame=None):
+        self.video = VideoService(video_path)
+        self.fps = self.video.get_fps()
+        self.frame_count = self.video.get_frame_count()
+        self.resolution = self.video.get_resolution()
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        if start_frame:
+            self.video.seek(start_frame)
+
+        self.frames = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._finished = False
+        self._pushed_back = None
+        self.last_decode_seconds = 0.0  # decode time of the frame last returned by read()
+        self._thread = threading.Thread(target=self._decode, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # Block while the queue is full (backpressure), but wake up on close()
+        while not self._stop.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode(self):
+        remaining = None if self.end_frame is None else self.end_frame - self.start_frame
+        try:
+            while not self._stop.is_set() and remaining != 0:
+                if remaining is not None:
+                    remaining -= 1
+                start = time.perf_counter()
+                frame = self.video.get_next_frame()
+                if frame is None:
+                    break
+                seconds = time.perf_counter() - start
+                STAGE_SECONDS.observe(seconds, stage="decode")
+                if not self._put((frame, seconds)):
+                    break
+        except Exception as e:
+            self._error = e
+        finally:
+            self.video.release()
+            self._put(_END_OF_STREAM)
+
+    def read(self):
+        # Next decoded frame, or None once the stream has ended
+        if self._pushed_back is not None:
+            (frame, self.last_decode_seconds), self._pushed_back = self._pushed_back, None
+            return frame
+        if self._finished:
+            return None
+        item = self.frames.get()
+        if item is _END_OF_STREAM:
+            self._finished = True
+            if self._error is not None:
+                raise self._error
+            return None
+        frame, self.last_decode_seconds = item
+        return frame
+
+    def unread(self, frame):
+        # Return a frame to the front of the stream (one frame deep)
+        self._pushed_back = (frame, self.last_decode_seconds)
+
+    def __iter__(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+    def close(self):
+        self._stop.set()
+        # Drain so a decoder blocked on a full queue can exit
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join()
+        self._finished = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ✅ Iterates (coach_frame, student_frame) pairs decoded on two background threads.
+# Iteration stops at the end of the shorter stream; the longer stream stays
+# readable through `coach` / `student` until close().
+class FramePairReader:
+    def __init__(self, coach_path, student_path, queue_size=8):
+        self.coach = PrefetchingVideoReader(coach_path, queue_size)
+        try:
+            self.student = PrefetchingVideoReader(student_path, queue_size)
+        except Exception:
+            self.coach.close()
+            raise
+
+    def __iter__(self):
+        while True:
+            frame1 = self.coach.read()
+            frame2 = self.student.read()
+            if frame1 is None or frame2 is None:
+                # Keep the unmatched frame readable from the longer stream
+                if frame1 is not None:
+                    self.coach.unread(frame1)
+                if frame2 is not None:
+                    self.student.unread(frame2)
+                return
+            yield frame1, frame2
+
+    def close(self):
+        self.coach.close()
+        self.student.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ✅ Encodes frames on a dedicated writer thread fed by a bounded queue
+class AsyncVideoWriter:
+    def __init__(self, path, fps, size, queue_size=16, fourcc="mp4v"):
+        self.path = path
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise IOError(f"❌ Cannot open video writer: {path}")
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.frames_written = 0
+        self._error = None
+        self._thread = threading.Thread(target=self._encode, daemon=True)
+        self._thread.start()
+
+    def _encode(self):
+        while True:
+            frame = self.frames.get()
+            if frame is _END_OF_STREAM:
+                break
+            if self._error is not None:
+                continue  # keep draining so producers never block
+            try:
+                start = time.perf_counter()
+                self.writer.write(frame)
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage="overlay_encode")
+                self.frames_written += 1
+            except Exception as e:
+                self._error = e
+        self.writer.release()
+
+    def write(self, frame):
+        # Blocks when the encoder falls behind (backpressure)
+        if self._error is not None:
+            raise self._error
+        self.frames.put(frame)
+
+    def close(self):
+        self.frames.put(_END_OF_STREAM)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 # ✅ Draw keypoints on a frame
 def draw_keypoints(frame, keypoints, threshold=0.3):
     h, w, _ = frame.shape
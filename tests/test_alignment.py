@@ -0,0 +1,37 @@
+import numpy as np
+from utils.alignment import align_sequences
+
+
+def _poses(frames, seed=0):
+    rng = np.random.default_rng(seed)
+    keypoints = rng.random((frames, 17, 3)).astype(np.float32)
+    keypoints[..., 2] = 0.9
+    return keypoints
+
+
+def _assert_valid_path(coach_index, coach_frames, student_frames):
+    assert len(coach_index) == student_frames
+    assert coach_index.min() >= 0 and coach_index.max() < coach_frames
+    steps = np.diff(coach_index)
+    assert (steps >= 0).all() and (steps <= 2).all()
+
+
+def test_coach_much_longer_than_student():
+    # 30 s coach demo vs 10 s student clip at 30 fps used to index past the band
+    coach, student = _poses(900), _poses(300, seed=1)
+    coach_index, cost = align_sequences(coach, student, band=90)
+    _assert_valid_path(coach_index, 900, 300)
+    assert np.isfinite(cost)
+
+    coach_index, _ = align_sequences(_poses(3000), student, band=90)
+    _assert_valid_path(coach_index, 3000, 300)
+
+
+def test_student_much_longer_than_coach():
+    # Student repeats every coach frame three times: the path should still cover the coach
+    coach = _poses(300)
+    student = np.repeat(coach, 3, axis=0)
+    coach_index, cost = align_sequences(coach, student, band=90)
+    _assert_valid_path(coach_index, 300, 900)
+    assert np.isfinite(cost)
+    assert coach_index[-1] >= 290
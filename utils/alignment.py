@@ -0,0 +1,125 @@
+import numpy as np
+from utils.similarity import CONFIDENCE_THRESHOLD, normalized_poses
+
+# Cost of a frame pair with no jointly visible keypoints (normalized distances are ~0-2)
+NO_OVERLAP_COST = 2.0
+
+
+def _pair_features(xy, weights):
+    # Weighted squared distance summed over joints factorizes into dot products:
+    #   Σ_k w_ik w_jk |a_ik - b_jk|² = left_i · right_j,   Σ_k w_ik w_jk = w_i · w_j
+    sq = (xy ** 2).sum(axis=-1)
+    wxy = (weights[..., None] * xy).reshape(len(xy), -1)
+    left = np.concatenate([weights * sq, weights, -2 * wxy], axis=1)
+    right = np.concatenate([weights, weights * sq, wxy], axis=1)
+    return left.astype(np.float32), right.astype(np.float32)
+
+
+def _band_costs(coach_xy, coach_w, student_xy, student_w, lo, width, chunk_size=512):
+    # ✅ Weighted RMS pose distance for every (student frame, coach frame) cell inside the
+    # band → [N, width]. Each chunk of rows is one dense matmul over the columns its band
+    # spans, then the band is sliced out.
+    n, m = len(student_xy), len(coach_xy)
+    student_left, _ = _pair_features(student_xy, student_w)
+    _, coach_right = _pair_features(coach_xy, coach_w)
+    offsets = np.arange(width)
+    costs = np.empty((n, width), np.float32)
+
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        col0 = max(int(lo[start]), 0)
+        col1 = min(int(lo[end - 1]) + width, m)
+        if col1 <= col0:
+            costs[start:end] = np.inf
+            continue
+
+        numerator = student_left[start:end] @ coach_right[col0:col1].T
+        denominator = student_w[start:end] @ coach_w[col0:col1].T
+
+        columns = lo[start:end, None] + offsets[None, :]
+        valid = (columns >= col0) & (columns < col1)
+        local = np.clip(columns - col0, 0, col1 - col0 - 1)
+        rows = np.arange(end - start)[:, None]
+        num, den = numerator[rows, local], denominator[rows, local]
+
+        cost = np.where(den > 0, np.sqrt(np.maximum(num, 0) / np.maximum(den, 1e-6)), NO_OVERLAP_COST)
+        costs[start:end] = np.where(valid, cost, np.inf)
+    return costs
+
+
+def _banded_dtw(coach, student, band, threshold):
+    n, m = len(student), len(coach)
+    coach_xy, coach_w = normalized_poses(coach, threshold)
+    student_xy, student_w = normalized_poses(student, threshold)
+
+    # The band follows the diagonal, but never climbs faster than the coach can advance
+    # (2 frames per student frame) or its cells become unreachable when m > 2n
+    rows = np.arange(n)
+    center = np.minimum(np.round(rows * ((m - 1) / max(n - 1, 1))).astype(np.int64), 2 * rows + band)
+    lo = center - band
+    width = 2 * band + 1
+    costs = _band_costs(coach_xy, coach_w, student_xy, student_w, lo, width)
+
+    # Band shift between rows is >= 0; predecessors sit at column offsets delta - {0, 1, 2}
+    starts = 2 + np.diff(lo)
+    padded = np.full(width + int(starts.max(initial=2)), np.inf, np.float32)
+    back = np.zeros((n, width), np.int8)
+    prev = costs[0].copy()
+    best = np.empty(width, np.float32)
+    advanced = np.empty(width, bool)
+    skipped = np.empty(width, bool)
+
+    for i in range(1, n):
+        padded[2:2 + width] = prev
+        s = starts[i - 1]
+        stay = padded[s:s + width]          # coach frame unchanged
+        step = padded[s - 1:s - 1 + width]  # coach advanced by 1
+        skip = padded[s - 2:s - 2 + width]  # coach advanced by 2
+
+        np.less(step, stay, out=advanced)
+        np.minimum(stay, step, out=best)
+        np.less(skip, best, out=skipped)
+        np.minimum(best, skip, out=best)
+        back[i] = advanced
+        back[i][skipped] = 2
+        np.add(costs[i], best, out=prev)
+
+    if not np.isfinite(prev).any():
+        # No path through the band: pair frames by index rather than backtrack through inf cells
+        print("⚠️ Alignment found no path within the band; pairing frames by index")
+        return np.minimum(np.arange(n), m - 1), NO_OVERLAP_COST
+
+    # ✅ Backtrack from the best end cell
+    coach_index = np.empty(n, np.int64)
+    k = int(np.argmin(prev))
+    total = float(prev[k])
+    for i in range(n - 1, -1, -1):
+        j = int(lo[i] + k)
+        coach_index[i] = j
+        if i:
+            k = j - int(back[i, k]) - int(lo[i - 1])
+
+    return np.clip(coach_index, 0, m - 1), total / n
+
+
+def align_sequences(coach, student, band=90, threshold=CONFIDENCE_THRESHOLD, max_steps=8000):
+    # ✅ Banded DTW between coach and student keypoint sequences ([M, 17, 3] / [N, 17, 3]).
+    # Each student frame is matched to exactly one coach frame; between consecutive student
+    # frames the coach advances by 0, 1 or 2 frames (student up to 2x slower or faster).
+    # Start and end are open within the band so late starts / early stops aren't penalised.
+    # Only a band of ±`band` frames around the diagonal is evaluated: O(N·band) time and memory.
+    # Sequences longer than max_steps are aligned on every k-th frame and the path is
+    # interpolated back, keeping long sessions well under a second.
+    # Returns (coach_index [N], mean matched cost).
+    n, m = len(student), len(coach)
+    if n == 0 or m == 0:
+        return np.zeros(0, np.int64), 0.0
+
+    stride = max(1, -(-max(n, m) // max_steps))
+    if stride == 1:
+        return _banded_dtw(coach, student, band, threshold)
+
+    sub_index, cost = _banded_dtw(coach[::stride], student[::stride], max(1, band // stride), threshold)
+    student_frames = np.arange(0, n, stride)
+    coach_index = np.interp(np.arange(n), student_frames, sub_index * stride)
+    return np.clip(np.round(coach_index).astype(np.int64), 0, m - 1), cost
@@ -0,0 +1,63 @@
+import os
+import re
+import shutil
+import time
+import uuid
+from utils.feature_cache import load_arrays, save_arrays
+
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "results/artifacts")
+
+
+def artifacts_path(drill_id):
+    safe_id = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(drill_id)).strip("_")
+    return os.path.join(ARTIFACTS_DIR, safe_id)
+
+
+def save_drill_artifacts(drill_id, coach, student, meta=None):
+    # ✅ Raw per-frame inference outputs (keypoints, balls, CLIP embeddings + logits) as .npy,
+    # so scoring can be re-run later without MoveNet/CLIP
+    arrays = {f"coach_{name}": array for name, array in coach.items()}
+    arrays.update({f"student_{name}": array for name, array in student.items()})
+    path = artifacts_path(drill_id)
+    # Built in a temp directory and swapped in whole: earlier artifacts may be memory-mapped
+    # by a rescore or live session, and rewriting their files in place would tear those reads
+    tag = uuid.uuid4().hex
+    tmp_path, old_path = f"{path}.tmp-{tag}", f"{path}.tmp-old-{tag}"
+    try:
+        save_arrays(tmp_path, arrays, meta=dict(meta or {}, drill_id=str(drill_id), saved_at=time.time()))
+        if os.path.isdir(path):
+            os.replace(path, old_path)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.isdir(old_path):
+                os.replace(old_path, path)
+            raise
+    finally:
+        # Open memory maps of the previous files stay valid after unlink
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        shutil.rmtree(old_path, ignore_errors=True)
+    return path
+
+
+def load_drill_artifacts(drill_id):
+    # Memory-mapped (coach, student, meta); raises FileNotFoundError when nothing is stored
+    arrays, meta = load_arrays(artifacts_path(drill_id))
+    if arrays is None:
+        raise FileNotFoundError(f"No stored artifacts for {drill_id}")
+    coach = {name[len("coach_"):]: array for name, array in arrays.items() if name.startswith("coach_")}
+    student = {name[len("student_"):]: array for name, array in arrays.items() if name.startswith("student_")}
+    return coach, student, meta
+
+
+def list_drill_artifacts():
+    if not os.path.isdir(ARTIFACTS_DIR):
+        return []
+    drills = []
+    for name in sorted(os.listdir(ARTIFACTS_DIR)):
+        if ".tmp-" in name:
+            continue
+        _, meta = load_arrays(os.path.join(ARTIFACTS_DIR, name))
+        if meta is not None:
+            drills.append(meta["drill_id"])
+    return drills
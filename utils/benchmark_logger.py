@@ -1,38 +1,63 @@
 import os
 import csv
 import cv2
-import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
+import time
+from services.video_service import AsyncVideoWriter, PrefetchingVideoReader, draw_keypoints
+from utils.metrics import STAGE_SECONDS
+from utils.similarity import CONFIDENCE_THRESHOLD
+
+# Per-frame stage timing columns, in the order of drill_evaluator.TIMED_STAGES
+TIMING_COLUMNS = ("decode_ms", "pose_ms", "ball_ms", "clip_ms")
+
+def _ball_str(ball):
+    # Same text as the original tuple logging: "(x, y)" or "None"
+    return "None" if np.isnan(ball[0]) else str((int(ball[0]), int(ball[1])))
+
 
 class BenchmarkLogger:
-    def __init__(self, drill_id):
+    def __init__(self, drill_id, threshold=CONFIDENCE_THRESHOLD):
         self.drill_id = drill_id
+        self.threshold = threshold
         self.rows = []
-        self.overlay_writer = None
         self.overlay_path = f"results/overlay_drill_{drill_id}.mp4"
         os.makedirs("results", exist_ok=True)
 
-    def log(self, frame_num, coach_kps, student_kps, pose_sim, ball1, ball2, label1, label2, clip_sim):
-        coach_acc = self._calculate_accuracy(coach_kps)
-        student_acc = self._calculate_accuracy(student_kps)
-
-        self.rows.append({
+    def log_drill(self, scored):
+        # ✅ One row per student frame from utils.scoring.score_drill() arrays
+        inferred = scored["inferred"].astype(int).tolist()
+        columns = zip(
+            scored["frame_num"].tolist(),
+            scored["coach_frame"].tolist(),
+            scored["coach_acc"].astype(float).round(2).tolist(),
+            scored["student_acc"].astype(float).round(2).tolist(),
+            scored["pose_sim"].astype(float).round(2).tolist(),
+            scored["ball1"], scored["ball2"],
+            scored["coach_label"].tolist(), scored["student_label"].tolist(),
+            scored["clip_sim"].astype(float).round(3).tolist(),
+            inferred
+        )
+        self.rows = [{
             "drill_id": self.drill_id,
             "frame_num": frame_num,
+            "coach_frame": coach_frame,
             "coach_acc": coach_acc,
             "student_acc": student_acc,
             "pose_sim": pose_sim,
-            "ball1": str(ball1),
-            "ball2": str(ball2),
+            "ball1": _ball_str(ball1),
+            "ball2": _ball_str(ball2),
             "clip_label": f"{label1} vs {label2}",
-            "clip_sim": clip_sim
-        })
-
-    def _calculate_accuracy(self, keypoints, threshold=0.3):
-        if not keypoints:
-            return 0.0
-        visible = [kp for kp in keypoints if kp[2] > threshold]
-        return round(len(visible) / len(keypoints) * 100, 2)
+            "clip_sim": clip_sim,
+            "pose_inferred": flags[0],
+            "ball_inferred": flags[1],
+            "clip_inferred": flags[2]
+        } for (frame_num, coach_frame, coach_acc, student_acc, pose_sim, ball1, ball2,
+               label1, label2, clip_sim, flags) in columns]
+
+        # ✅ Per-frame stage latency (ms), when the artifacts carry timings
+        if scored.get("timings") is not None:
+            for row, timings in zip(self.rows, scored["timings"].astype(float).round(3).tolist()):
+                row.update(zip(TIMING_COLUMNS, timings))
 
     def save_to_csv(self):
         if not self.rows:
@@ -46,93 +71,101 @@ class BenchmarkLogger:
             writer.writerows(self.rows)
         print(f"✅ CSV saved: {csv_path}")
 
-    def save_overlay_video(self):
-        csv_path = self._csv_path()
-        if not os.path.exists(csv_path):
-            # Auto-save CSV if not already done
-            print("ℹ️ CSV not found. Attempting to save it first...")
-            self.save_to_csv()
-            if not os.path.exists(csv_path):
-                print(f"❌ Still missing: {csv_path}")
-                return
-
-        df = pd.read_csv(csv_path)
-
-        # Construct video path using drill number
-        drill_num = self.drill_id.split()[-1]
-        video_path = f"videos/student_drill{drill_num}.MP4"
-        if not os.path.exists(video_path):
-            print(f"❌ Missing student video: {video_path}")
-            return
-
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            print(f"❌ Failed to open video: {video_path}")
-            return
-
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        out = cv2.VideoWriter(self.overlay_path, fourcc, fps, (width, height))
-
-        idx = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret or idx >= len(df):
-                break
-
-            row = df.iloc[idx]
-            text = f"Coach: {row['coach_acc']}%  Student: {row['student_acc']}%  Sim: {row['pose_sim']:.2f}  Action: {row['clip_label']}"
+        total = len(self.rows)
+        for stage in ("pose", "ball", "clip"):
+            inferred = sum(row[f"{stage}_inferred"] for row in self.rows)
+            print(f"ℹ️ {stage}: inferred on {inferred}/{total} frames")
+        return csv_path
 
-            cv2.putText(frame, text, (20, 40), cv2.FONT_HERSHEY_SIMPLEX,
-                        0.6, (255, 255, 255), 2)
-            out.write(frame)
-            idx += 1
-
-        cap.release()
-        out.release()
+    def save_overlay_video(self, video_path, student_keypoints):
+        # ✅ Student video annotated with keypoints and the aligned scores. Runs after
+        # scoring (the alignment needs both full sequences); decoding and encoding each
+        # run on their own thread, no CSV round-trip.
+        if not self.rows:
+            print("⚠️ No rows available to render the overlay.")
+            return None
+
+        with PrefetchingVideoReader(video_path) as reader:
+            writer = None
+            try:
+                for row, frame in zip(self.rows, reader):
+                    if writer is None:
+                        height, width = frame.shape[:2]
+                        writer = AsyncVideoWriter(self.overlay_path, reader.fps or 30.0, (width, height))
+
+                    start = time.perf_counter()
+                    frame = draw_keypoints(frame, student_keypoints[row["frame_num"]], self.threshold)
+                    text = (f"Coach: {row['coach_acc']}%  Student: {row['student_acc']}%  "
+                            f"Sim: {row['pose_sim']:.2f}  Action: {row['clip_label']}")
+                    cv2.putText(frame, text, (20, 40), cv2.FONT_HERSHEY_SIMPLEX,
+                                0.6, (255, 255, 255), 2)
+                    cv2.putText(frame, f"Coach frame: {row['coach_frame']}", (20, 70),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                    seconds = time.perf_counter() - start
+                    STAGE_SECONDS.observe(seconds, stage="draw")
+                    row["draw_ms"] = round(seconds * 1000, 3)
+                    writer.write(frame)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+        if writer is None:
+            print(f"❌ No frames decoded from: {video_path}")
+            return None
         print(f"🎥 Overlay video saved: {self.overlay_path}")
+        return self.overlay_path
 
     def save_summary_charts(self):
         if not self.rows:
             print("⚠️ No rows available to generate charts.")
             return
 
+        # Heavy plotting imports only on the chart path. Explicit Figure objects on the Agg
+        # canvas instead of pyplot: pyplot's current-figure state is global, and charts are
+        # rendered concurrently from job workers and the rescore threadpool
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        import pandas as pd
+
         df = pd.DataFrame(self.rows)
 
+        def save(fig, path):
+            FigureCanvasAgg(fig)
+            fig.savefig(path)
+
         # Accuracy chart
-        plt.figure()
-        plt.plot(df["frame_num"], df["coach_acc"], label="Coach Accuracy")
-        plt.plot(df["frame_num"], df["student_acc"], label="Student Accuracy")
-        plt.xlabel("Frame")
-        plt.ylabel("Accuracy (%)")
-        plt.legend()
-        plt.title("Pose Accuracy Over Time")
-        plt.savefig("results/pose_accuracy_hist.png")
-        plt.close()
+        fig = Figure()
+        ax = fig.add_subplot()
+        ax.plot(df["frame_num"], df["coach_acc"], label="Coach Accuracy")
+        ax.plot(df["frame_num"], df["student_acc"], label="Student Accuracy")
+        ax.set_xlabel("Frame")
+        ax.set_ylabel("Accuracy (%)")
+        ax.legend()
+        ax.set_title("Pose Accuracy Over Time")
+        save(fig, "results/pose_accuracy_hist.png")
 
         # Confusion chart
-        plt.figure()
+        fig = Figure()
+        ax = fig.add_subplot()
         label_diffs = df["clip_label"].apply(lambda x: x.split(" vs "))
         mismatch = [1 if a != b else 0 for a, b in label_diffs]
-        plt.plot(df["frame_num"], mismatch, label="Action Mismatch (1 = mismatch)")
-        plt.xlabel("Frame")
-        plt.ylabel("Mismatch")
-        plt.title("Semantic Action Mismatches")
-        plt.savefig("results/pose_accuracy_confusion.png")
-        plt.close()
+        ax.plot(df["frame_num"], mismatch, label="Action Mismatch (1 = mismatch)")
+        ax.set_xlabel("Frame")
+        ax.set_ylabel("Mismatch")
+        ax.set_title("Semantic Action Mismatches")
+        save(fig, "results/pose_accuracy_confusion.png")
 
         # CLIP similarity
-        plt.figure()
-        plt.plot(df["frame_num"], df["clip_sim"], label="CLIP Similarity")
-        plt.xlabel("Frame")
-        plt.ylabel("Cosine Similarity")
-        plt.title("CLIP Semantic Similarity Over Time")
-        plt.savefig("results/benchmark_plot.png")
-        plt.close()
+        fig = Figure()
+        ax = fig.add_subplot()
+        ax.plot(df["frame_num"], df["clip_sim"], label="CLIP Similarity")
+        ax.set_xlabel("Frame")
+        ax.set_ylabel("Cosine Similarity")
+        ax.set_title("CLIP Semantic Similarity Over Time")
+        save(fig, "results/benchmark_plot.png")
 
         print("📊 Charts saved in 'results/'.")
+        return ["results/pose_accuracy_hist.png", "results/pose_accuracy_confusion.png", "results/benchmark_plot.png"]
 
     def _csv_path(self):
         return f"results/log_drill_{self.drill_id}.csv"
@@ -1,27 +1,100 @@
 import psycopg2
 import os
+import threading
+import time
+from psycopg2 import pool
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
+from utils.metrics import span
 
 # ✅ Load environment variables from .env file
 load_dotenv()
 
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_FLUSH_SIZE = int(os.getenv("DB_FLUSH_SIZE", "500"))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "2.0"))
+# Seconds a DBLogger waits for a free pool connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+_tables_ready = False
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+def get_pool():
+    # ✅ One connection pool per process, shared by every DBLogger
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None:
+            db_url = os.getenv("DATABASE_URL")
+            if not db_url:
+                raise ValueError("❌ DATABASE_URL is not set in the environment.")
+            _pool = pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, db_url)
+            # getconn() raises when exhausted; make callers wait for a free slot instead
+            _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+            print("✅ Connected to PostgreSQL")
+    return _pool
+
+
+def close_pool():
+    global _pool, _tables_ready
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _tables_ready = False
+            print("🔒 PostgreSQL pool closed")
+
+
 class DBLogger:
-    def __init__(self):
-        db_url = os.getenv("DATABASE_URL")
-        if not db_url:
-            raise ValueError("❌ DATABASE_URL is not set in the environment.")
+    def __init__(self, flush_size=DB_FLUSH_SIZE, flush_interval=DB_FLUSH_INTERVAL):
+        global _tables_ready
+        # Frame rows are buffered and written in batches of flush_size,
+        # or after flush_interval seconds; close() flushes the rest
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.monotonic()
 
+        self.conn = None
+        slot = None
         try:
-            self.conn = psycopg2.connect(db_url)
+            self.pool = get_pool()
+            if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+                raise PoolTimeoutError(f"❌ No database connection free after {DB_POOL_TIMEOUT:g}s")
+            slot = _pool_slots
+            self.conn = self.pool.getconn()
             self.cursor = self.conn.cursor()
-            print("✅ Connected to PostgreSQL")
 
-            # Create required tables
-            self.create_table()
-            self.create_player_performance_table()
+            # Create required tables once per process
+            if not _tables_ready:
+                self.create_table()
+                self.create_player_performance_table()
+                self.create_indexes()
+                _tables_ready = True
         except Exception as e:
             print(f"❌ Database connection failed: {e}")
+            # Give back whatever was taken, or failed connects leak pool slots until every
+            # later DBLogger() blocks forever
+            if self.conn is not None:
+                self.pool.putconn(self.conn)
+                self.conn = None
+            if slot is not None:
+                slot.release()
             raise
+        self._slot = slot
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def create_table(self):
         try:
@@ -60,29 +133,119 @@ class DBLogger:
         except Exception as e:
             print(f"❌ Failed to create 'player_performance' table: {e}")
 
+    def create_indexes(self):
+        try:
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_performance_drill_frame
+                ON performance (drill_id, frame_num)
+            """)
+            # Keyset pagination over the full report (ORDER BY frame_num, id)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_performance_frame_id
+                ON performance (frame_num, id)
+            """)
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_player_performance_player_drill
+                ON player_performance (player_id, drill_id)
+            """)
+            self.conn.commit()
+        except Exception as e:
+            print(f"❌ Failed to create indexes: {e}")
+            self.conn.rollback()
+
+    def fetch_dicts(self, query, params=None):
+        self.cursor.execute(query, params)
+        columns = [col[0] for col in self.cursor.description]
+        return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+
     def insert_performance(self, drill_id, frame_num, coach_acc, student_acc,
                            clip_label, clip_sim, pose_sim, ball1, ball2):
+        self.buffer.append((
+            str(drill_id),
+            int(frame_num),
+            float(coach_acc),
+            float(student_acc),
+            str(clip_label),
+            float(clip_sim),
+            float(pose_sim),
+            str(ball1),
+            str(ball2)
+        ))
+        if len(self.buffer) >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def insert_performance_many(self, rows):
+        # rows: dicts with the insert_performance keyword arguments
+        for row in rows:
+            self.insert_performance(**row)
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        rows, self.buffer = self.buffer, []
+        try:
+            # ✅ One multi-row INSERT + one commit per batch
+            with span("db_write"):
+                execute_values(self.cursor, """
+                    INSERT INTO performance (
+                        drill_id, frame_num, coach_acc, student_acc,
+                        clip_label, clip_sim, pose_sim, ball1, ball2
+                    ) VALUES %s
+                """, rows, page_size=len(rows))
+                self.conn.commit()
+        except Exception as e:
+            print(f"❌ Failed to insert {len(rows)} frame-level performance rows: {e}")
+            self.conn.rollback()
+
+    def replace_performance(self, drill_id, rows):
+        # ✅ Swap all frame rows of a drill in one transaction (used by rescoring)
+        self.flush()
+        values = [(
+            str(drill_id),
+            int(row["frame_num"]),
+            float(row["coach_acc"]),
+            float(row["student_acc"]),
+            str(row["clip_label"]),
+            float(row["clip_sim"]),
+            float(row["pose_sim"]),
+            str(row["ball1"]),
+            str(row["ball2"])
+        ) for row in rows]
+        try:
+            with span("db_write"):
+                self.cursor.execute("DELETE FROM performance WHERE drill_id = %s", (str(drill_id),))
+                execute_values(self.cursor, """
+                    INSERT INTO performance (
+                        drill_id, frame_num, coach_acc, student_acc,
+                        clip_label, clip_sim, pose_sim, ball1, ball2
+                    ) VALUES %s
+                """, values, page_size=1000)
+                self.conn.commit()
+        except Exception as e:
+            print(f"❌ Failed to replace frame-level performance for {drill_id}: {e}")
+            self.conn.rollback()
+            raise
+
+    def refresh_player_summaries(self, drill_id):
+        # Recompute stored player summaries of a drill from its current frame rows
         try:
             self.cursor.execute("""
-                INSERT INTO performance (
-                    drill_id, frame_num, coach_acc, student_acc,
-                    clip_label, clip_sim, pose_sim, ball1, ball2
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                str(drill_id),
-                int(frame_num),
-                float(coach_acc),
-                float(student_acc),
-                str(clip_label),
-                float(clip_sim),
-                float(pose_sim),
-                str(ball1),
-                str(ball2)
-            ))
+                UPDATE player_performance
+                SET (average_coach_accuracy, average_student_accuracy, average_pose_similarity) = (
+                    SELECT AVG(coach_acc), AVG(student_acc), AVG(pose_sim)
+                    FROM performance WHERE drill_id = %s
+                )
+                WHERE drill_id = %s
+                  AND EXISTS (SELECT 1 FROM performance WHERE drill_id = %s)
+            """, (str(drill_id), str(drill_id), str(drill_id)))
+            updated = self.cursor.rowcount
             self.conn.commit()
+            return updated
         except Exception as e:
-            print(f"❌ Failed to insert frame-level performance: {e}")
+            print(f"❌ Failed to refresh player summaries for {drill_id}: {e}")
             self.conn.rollback()
+            raise
 
     def insert_player_performance(self, player_id, drill_id, coach_avg, student_avg, pose_sim_avg):
         try:
@@ -124,6 +287,18 @@ class DBLogger:
             self.conn.rollback()
 
     def close(self):
-        self.cursor.close()
-        self.conn.close()
-        print("🔒 PostgreSQL connection closed")
+        if self.conn is None:
+            return
+        try:
+            self.flush()
+        finally:
+            # The connection and its slot always go back, even when the last flush fails
+            # (the pool rolls back an aborted transaction on putconn)
+            conn, self.conn = self.conn, None
+            try:
+                if not conn.closed:
+                    self.cursor.close()
+                # Broken connections are dropped instead of going back to the pool
+                self.pool.putconn(conn, close=bool(conn.closed))
+            finally:
+                self._slot.release()
@@ -0,0 +1,242 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+INDEX_DIR = os.getenv("DRILL_INDEX_DIR", "results/index")
+# Coarse (IVF) partitions: 0 → flat below INDEX_IVF_MIN drills, ~sqrt(n) lists above
+INDEX_LISTS = int(os.getenv("DRILL_INDEX_LISTS", "0"))
+INDEX_IVF_MIN = int(os.getenv("DRILL_INDEX_IVF_MIN", "256"))
+# Lists scanned per query when partitioned
+INDEX_PROBES = int(os.getenv("DRILL_INDEX_PROBES", "4"))
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def drill_signature(embeddings):
+    # ✅ One L2-normalized vector per video: mean of its (normalized) CLIP frame embeddings
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if not len(embeddings):
+        raise ValueError("❌ Cannot build a drill signature from zero frames")
+    return _normalize(_normalize(embeddings).mean(axis=0))
+
+
+def _matrix_version(name):
+    # matrix-<time_ns>-<hex> → time_ns; unversioned (older) builds sort first
+    try:
+        return int(name.split("-")[1])
+    except (IndexError, ValueError):
+        return -1
+
+
+def kmeans(matrix, lists, iterations=20, seed=0):
+    # Spherical k-means on normalized rows → (centroids [lists, D], assignment [N])
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), size=lists, replace=False)].copy()
+    assignment = np.zeros(len(matrix), np.int32)
+    for _ in range(iterations):
+        assignment = (matrix @ centroids.T).argmax(axis=1).astype(np.int32)
+        for i in range(lists):
+            members = matrix[assignment == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids, assignment
+
+
+class DrillIndex:
+    # ✅ Nearest-neighbour library of coach drills over CLIP signatures.
+    # Registration writes one small entry file (safe from parallel workers); the searchable
+    # matrix (normalized float32, memory-mapped, optionally IVF-partitioned) is rebuilt from
+    # the entries when they change.
+    def __init__(self, index_dir=INDEX_DIR, lists=INDEX_LISTS, probes=INDEX_PROBES):
+        self.index_dir = index_dir
+        self.entries_dir = os.path.join(index_dir, "entries")
+        self.lists = lists
+        self.probes = probes
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self._loaded = None
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+    def _entry_path(self, key, ext):
+        safe_key = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(key))
+        return os.path.join(self.entries_dir, f"{safe_key}{ext}")
+
+    def get_entry(self, key):
+        path = self._entry_path(key, ".json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def register(self, key, embeddings, meta=None):
+        # key: coach video content hash; embeddings: [T, D] CLIP frame embeddings
+        meta = dict(meta or {}, key=key)
+        existing = self.get_entry(key)
+        if existing is not None and all(existing.get(name) == value for name, value in meta.items()):
+            return False  # already indexed with the same metadata
+
+        signature = drill_signature(embeddings)
+        tag = uuid.uuid4().hex
+        vector_path, meta_path = self._entry_path(key, ".npy"), self._entry_path(key, ".json")
+        np.save(f"{vector_path}.tmp-{tag}.npy", signature)
+        os.replace(f"{vector_path}.tmp-{tag}.npy", vector_path)
+        with open(f"{meta_path}.tmp-{tag}", "w") as f:
+            json.dump(dict(meta, added_at=time.time()), f, indent=2)
+        os.replace(f"{meta_path}.tmp-{tag}", meta_path)
+        return True
+
+    def _entries_state(self):
+        # Every registration renames files into entries/, which bumps the directory mtime
+        return os.stat(self.entries_dir).st_mtime_ns
+
+    @contextmanager
+    def _building(self):
+        # One build at a time: a thread lock within the process, a file lock across the
+        # batch worker processes sharing index_dir
+        with self.build_lock, open(os.path.join(self.index_dir, "build.lock"), "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def build(self):
+        with self._building():
+            return self._build()
+
+    def _build(self):
+        # ✅ Pack every entry into one normalized matrix (+ k-means lists for large libraries)
+        state = self._entries_state()
+        entries, vectors = [], []
+        for name in sorted(os.listdir(self.entries_dir)):
+            if not name.endswith(".json") or ".tmp-" in name:
+                continue
+            with open(os.path.join(self.entries_dir, name)) as f:
+                entry = json.load(f)
+            try:
+                vectors.append(np.load(self._entry_path(entry["key"], ".npy")))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Skipping unreadable index entry {name}: {e}")
+                continue
+            entries.append(entry)
+
+        # Arrays go to a fresh directory; index.json is swapped in last so readers never
+        # see a half-written build
+        matrix_name = f"matrix-{time.time_ns()}-{uuid.uuid4().hex}"
+        matrix_dir = os.path.join(self.index_dir, matrix_name)
+        os.makedirs(matrix_dir)
+        matrix = _normalize(np.stack(vectors)) if vectors else np.zeros((0, 0), np.float32)
+        np.save(os.path.join(matrix_dir, "signatures.npy"), matrix)
+
+        lists = self.lists or (int(round(np.sqrt(len(matrix)))) if len(matrix) >= INDEX_IVF_MIN else 0)
+        lists = lists if 1 < lists <= len(matrix) else 0
+        if lists:
+            centroids, assignment = kmeans(matrix, lists)
+            np.save(os.path.join(matrix_dir, "centroids.npy"), centroids)
+            np.save(os.path.join(matrix_dir, "assignment.npy"), assignment)
+
+        index_path = os.path.join(self.index_dir, "index.json")
+        tmp_path = f"{index_path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "w") as f:
+            json.dump({"state": state, "matrix": matrix_name, "lists": lists, "entries": entries}, f, indent=2)
+        os.replace(tmp_path, index_path)
+
+        # Drop builds older than the one index.json now references (open memory maps stay
+        # valid after unlink; a reader that lost the race reloads in _load)
+        for name in os.listdir(self.index_dir):
+            if name.startswith("matrix-") and _matrix_version(name) < _matrix_version(matrix_name):
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+        print(f"📚 Drill index built: {len(entries)} drill(s), {lists or 'flat'} list(s)")
+        return len(entries)
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.index_dir, "index.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _open(self, index):
+        matrix_dir = os.path.join(self.index_dir, index["matrix"])
+        index["signatures"] = np.load(os.path.join(matrix_dir, "signatures.npy"), mmap_mode="r")
+        if index["lists"]:
+            index["centroids"] = np.load(os.path.join(matrix_dir, "centroids.npy"))
+            index["assignment"] = np.load(os.path.join(matrix_dir, "assignment.npy"))
+        return index
+
+    def _load(self):
+        state = self._entries_state()
+        with self.lock:
+            loaded = self._loaded
+        if loaded is not None and loaded["state"] == state:
+            return loaded
+
+        index = self._read_index()
+        try:
+            if index is None or index["state"] != state:
+                raise FileNotFoundError("index is stale")
+            index = self._open(index)
+        except FileNotFoundError:
+            # Stale, or its matrix was superseded (or lost) while we read it: re-check under
+            # the build lock, where no build can delete it, and rebuild if still needed
+            with self._building():
+                index = self._read_index()
+                if (index is None or index["state"] != self._entries_state()
+                        or not os.path.isdir(os.path.join(self.index_dir, index["matrix"]))):
+                    self._build()
+                    index = self._read_index()
+                index = self._open(index)
+        with self.lock:
+            self._loaded = index
+        return index
+
+    def __len__(self):
+        return len(self._load()["entries"])
+
+    def search(self, embeddings, k=5, probes=None):
+        # Top-k coach drills for a clip's CLIP frame embeddings (or an existing signature)
+        index = self._load()
+        signatures = index["signatures"]
+        if not len(signatures):
+            return []
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        query = drill_signature(embeddings) if embeddings.ndim == 2 else _normalize(embeddings)
+
+        if index["lists"]:
+            # ✅ IVF: only scan the rows in the `probes` closest coarse lists
+            probes = min(probes or self.probes, index["lists"])
+            nearest = np.argsort(-(index["centroids"] @ query))[:probes]
+            rows = np.flatnonzero(np.isin(index["assignment"], nearest))
+        else:
+            rows = np.arange(len(signatures))
+
+        scores = signatures[rows] @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(index["entries"][rows[i]], score=round(float(scores[i]), 4)) for i in top]
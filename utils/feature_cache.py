@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+
+CACHE_DIR = os.getenv("COACH_CACHE_DIR", "results/cache/coach")
+CACHE_MAX_MB = float(os.getenv("COACH_CACHE_MAX_MB", "2048"))
+CACHE_MAX_AGE_DAYS = float(os.getenv("COACH_CACHE_MAX_AGE_DAYS", "30"))
+
+
+def hash_file(path, chunk_size=1 << 20):
+    # ✅ Content hash (sha256) of a video file, streamed in chunks
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_arrays(directory, arrays, meta=None):
+    # One .npy per array so each can be memory-mapped on load
+    os.makedirs(directory, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+    meta = dict(meta or {}, arrays=sorted(arrays))
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_arrays(directory, mmap_mode="r"):
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return None, None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+        for name in meta["arrays"]
+    }
+    return arrays, meta
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class FeatureCache:
+    # ✅ On-disk cache of per-frame coach artifacts, keyed by video content hash
+    def __init__(self, cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB, max_age_days=CACHE_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 24 * 3600
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, content_hash, signature=""):
+        # The signature covers anything that changes the artifacts (models, sampling)
+        config_hash = hashlib.sha1(signature.encode()).hexdigest()[:10]
+        return f"{content_hash}-{config_hash}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            arrays, _ = load_arrays(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable cache entry {key}: {e}")
+            return None
+        if arrays is not None:
+            os.utime(path)  # mark as recently used for eviction
+        return arrays
+
+    def save(self, key, arrays, meta=None):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        save_arrays(tmp_path, arrays, meta)
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            # Another worker stored the same entry first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.evict()
+        return path
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = self._path(name)
+            if not os.path.isdir(path) or ".tmp-" in name:
+                continue
+            mtime = os.path.getmtime(path)
+            if now - mtime > self.max_age:
+                shutil.rmtree(path, ignore_errors=True)
+                print(f"🧹 Evicted stale cache entry: {name}")
+                continue
+            entries.append((mtime, _dir_size(path), path))
+
+        # Least recently used first until we're under the size budget
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            print(f"🧹 Evicted cache entry over size budget: {os.path.basename(path)}")
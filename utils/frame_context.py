@@ -0,0 +1,57 @@
+import cv2
+
+
+class FrameContext:
+    # ✅ One decoded frame plus its derived views (grayscale, resized, thumbnails, CLIP crop),
+    # each computed on first use and shared by every stage that needs it. Stages get a
+    # read-only view of the BGR frame, so nothing can annotate what the others see.
+    # Not thread-safe: one context per frame, used by one stream.
+    def __init__(self, frame):
+        self.bgr = frame.view()
+        self.bgr.flags.writeable = False
+        self._views = {}
+
+    @property
+    def shape(self):
+        return self.bgr.shape
+
+    def view(self, key, compute):
+        if key not in self._views:
+            view = compute()
+            view.flags.writeable = False
+            self._views[key] = view
+        return self._views[key]
+
+    def cached(self, key):
+        # An already computed view, or None (lets stages avoid triggering full-frame work)
+        return self._views.get(key)
+
+    @property
+    def gray(self):
+        return self.view("gray", lambda: cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    def resized(self, size, interpolation=cv2.INTER_LINEAR):
+        # BGR frame resized to (width, height)
+        return self.view(("resized", size, interpolation),
+                         lambda: cv2.resize(self.bgr, size, interpolation=interpolation))
+
+    def thumbnail_gray(self, size):
+        # Small grayscale thumbnail (scene-change samplers); resize first, convert the few pixels
+        return self.view(("thumbnail_gray", size),
+                         lambda: cv2.cvtColor(self.resized(size, cv2.INTER_AREA), cv2.COLOR_BGR2GRAY))
+
+    def center_square(self, size):
+        # Center crop to a square, then resize to size x size (CLIP's Resize + CenterCrop field of view)
+        def compute():
+            h, w = self.bgr.shape[:2]
+            side = min(h, w)
+            top, left = (h - side) // 2, (w - side) // 2
+            square = self.bgr[top:top + side, left:left + side]
+            interpolation = cv2.INTER_AREA if side > size else cv2.INTER_CUBIC
+            return cv2.resize(square, (size, size), interpolation=interpolation)
+        return self.view(("center_square", size), compute)
+
+
+def as_context(frame):
+    # Stages accept a raw BGR frame or a shared FrameContext
+    return frame if isinstance(frame, FrameContext) else FrameContext(frame)
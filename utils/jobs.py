@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# MoveNet/CLIP are shared by all jobs in the process, keep 1 worker unless they're pooled
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "16"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "500"))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, drill_id, key=None):
+        self.id = uuid.uuid4().hex
+        self.drill_id = drill_id
+        self.key = key
+        self.status = "queued"
+        self.frames_processed = 0
+        self.total_frames = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0  # bumped on every change, lets SSE streams skip idle ticks
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def update_progress(self, frames_processed, total_frames=None):
+        self.frames_processed = frames_processed
+        self.total_frames = total_frames
+        self.version += 1
+
+    def to_dict(self):
+        percent = None
+        if self.total_frames:
+            percent = round(min(self.frames_processed / self.total_frames, 1.0) * 100, 1)
+        return {
+            "job_id": self.id,
+            "drill_id": self.drill_id,
+            "status": self.status,
+            "frames_processed": self.frames_processed,
+            "total_frames": self.total_frames,
+            "progress_percent": percent,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    # ✅ Bounded in-process worker pool for drill processing
+    def __init__(self, workers=JOB_WORKERS, queue_depth=JOB_QUEUE_DEPTH, history=JOB_HISTORY):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.history = history
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="drill-job")
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def active_count(self):
+        with self.lock:
+            return sum(1 for job in self.jobs.values() if not job.finished)
+
+    def status_counts(self):
+        # {"queued": n, "running": n, "done": n, "failed": n} over the kept history
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        with self.lock:
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def submit(self, fn, *args, job_key=None, **kwargs):
+        # fn must accept a progress=callback(frames_done, total_frames) keyword.
+        # job_key de-duplicates: an unfinished job with the same key is returned instead.
+        with self.lock:
+            if job_key is not None:
+                for job in self.jobs.values():
+                    if job.key == job_key and not job.finished:
+                        return job
+
+            active = sum(1 for job in self.jobs.values() if not job.finished)
+            if active >= self.queue_depth:
+                raise QueueFullError(f"Job queue is full ({active}/{self.queue_depth})")
+            job = Job(kwargs.get("drill_id"), key=job_key)
+            self.jobs[job.id] = job
+            self._trim_history()
+
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = time.time()
+        job.version += 1
+        try:
+            job.result = fn(*args, progress=job.update_progress, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.version += 1
+
+    def _trim_history(self):
+        # Forget the oldest finished jobs once we keep more than `history`
+        excess = len(self.jobs) - self.history
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished][:max(excess, 0)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,164 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds (per-frame stages up to whole drills)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"❌ {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _label_text(self.labelnames + ("le",), key + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    # ✅ Minimal in-process Prometheus registry (text exposition format 0.0.4)
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "drill_stage_seconds", "Latency of one pipeline stage call (decode, pose, ball, clip, draw, ...)", ["stage"]))
+FRAMES_TOTAL = REGISTRY.register(Counter(
+    "drill_frames_total", "Frames run through inference", ["stream"]))
+DRILLS_TOTAL = REGISTRY.register(Counter(
+    "drills_processed_total", "Drills processed"))
+DRILL_FPS = REGISTRY.register(Gauge(
+    "drill_last_fps", "Student frames per second of the last processed drill"))
+JOBS = REGISTRY.register(Gauge(
+    "drill_jobs", "Drill jobs in the queue by status", ["status"]))
+POSE_RUNS = REGISTRY.register(Counter(
+    "pose_inferences_total", "MoveNet runs by cascade role (primary/fallback) and input region (full/crop)",
+    ["model", "region"]))
+LIVE_FRAMES = REGISTRY.register(Counter(
+    "live_frames_total", "Streamed student frames by outcome (processed, dropped, sampled_out)", ["outcome"]))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]))
+
+
+@contextmanager
+def span(stage):
+    # ✅ Time one stage call into drill_stage_seconds
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+class FrameTimer:
+    # Per-frame stage timings (ms) for the benchmark CSV; every span also lands in
+    # the drill_stage_seconds histogram.
+    def __init__(self, stages):
+        self.stages = tuple(stages)
+        self.frames = []
+        self.current = {}
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds, frame_index=None, observe=True):
+        row = self.current if frame_index is None or frame_index == len(self.frames) else self.frames[frame_index]
+        row[stage] = row.get(stage, 0.0) + seconds * 1000
+        if observe:
+            STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def next_frame(self):
+        self.frames.append(self.current)
+        self.current = {}
+
+    def array(self):
+        # [T, len(stages)] milliseconds
+        return [[frame.get(stage, 0.0) for stage in self.stages] for frame in self.frames]
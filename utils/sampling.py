@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+from utils.frame_context import as_context
+
+STAGES = ("pose", "ball", "clip")
+
+
+class EveryFrameSampler:
+    def should_infer(self, frame_num, *frames):
+        return True
+
+
+class StrideSampler:
+    def __init__(self, stride=1):
+        if stride < 1:
+            raise ValueError(f"❌ Stride must be >= 1, got {stride}")
+        self.stride = stride
+
+    def should_infer(self, frame_num, *frames):
+        return frame_num % self.stride == 0
+
+
+class SceneChangeSampler:
+    # ✅ Cheap keyframe detector: compares a small grayscale thumbnail of each stream
+    # against the last inferred keyframe, using either mean absolute difference
+    # ("diff") or histogram Bhattacharyya distance ("hist"), both in [0, 1].
+    def __init__(self, threshold=0.1, method="diff", max_gap=30, thumb_size=(64, 36)):
+        if method not in ("diff", "hist"):
+            raise ValueError(f"❌ Unknown scene-change method: {method}")
+        self.threshold = threshold
+        self.method = method
+        self.max_gap = max_gap
+        self.thumb_size = thumb_size
+        self.references = None
+        self.last_keyframe = None
+
+    def _thumbnail(self, frame):
+        # Shared with the other stages' samplers when `frame` is a FrameContext
+        gray = as_context(frame).thumbnail_gray(self.thumb_size)
+        if self.method == "hist":
+            hist = cv2.calcHist([gray], [0], None, [32], [0, 256])
+            return cv2.normalize(hist, hist)
+        return gray
+
+    def _distance(self, a, b):
+        if self.method == "hist":
+            return cv2.compareHist(a, b, cv2.HISTCMP_BHATTACHARYYA)
+        return float(np.mean(cv2.absdiff(a, b))) / 255.0
+
+    def should_infer(self, frame_num, *frames):
+        thumbs = [self._thumbnail(frame) for frame in frames]
+
+        changed = (
+            self.references is None
+            or frame_num - self.last_keyframe >= self.max_gap
+            or any(self._distance(t, r) > self.threshold for t, r in zip(thumbs, self.references))
+        )
+        if changed:
+            self.references = thumbs
+            self.last_keyframe = frame_num
+        return changed
+
+
+def make_sampler(spec):
+    # Spec strings: "every", "stride:<n>", "scene:<threshold>", "hist:<threshold>"
+    if spec is None or spec == "every":
+        return EveryFrameSampler()
+    if not isinstance(spec, str):
+        return spec  # already a sampler instance
+
+    kind, _, arg = spec.partition(":")
+    if kind == "stride":
+        return StrideSampler(int(arg or 1))
+    if kind == "scene":
+        return SceneChangeSampler(float(arg or 0.1), method="diff")
+    if kind == "hist":
+        return SceneChangeSampler(float(arg or 0.2), method="hist")
+    raise ValueError(f"❌ Unknown sampling spec: {spec}")
+
+
+def build_samplers(sampling=None):
+    # Fresh (stateful) samplers per stage, e.g. {"clip": "scene:0.08", "ball": "stride:2"}
+    sampling = sampling or {}
+    unknown = set(sampling) - set(STAGES)
+    if unknown:
+        raise ValueError(f"❌ Unknown sampling stage(s): {', '.join(sorted(unknown))}")
+    return {stage: make_sampler(sampling.get(stage)) for stage in STAGES}
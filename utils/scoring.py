@@ -0,0 +1,90 @@
+import os
+import numpy as np
+from utils.alignment import align_sequences
+from utils.similarity import CONFIDENCE_THRESHOLD, score_pose_sequences
+
+# Maximum coach/student offset the alignment searches, in seconds
+ALIGN_BAND_SECONDS = 3.0
+
+
+def score_drill(coach, student, labels, align=True, fps=30.0, threshold=CONFIDENCE_THRESHOLD):
+    # ✅ Per-student-frame metrics from raw per-frame artifacts, no model inference.
+    # coach/student: {"keypoints": [T, 17, 3], "balls": [T, 2] (NaN = no ball),
+    #                 "clip": [T, D], "clip_logits": [T, len(labels)], "inferred": [T, 3],
+    #                 "timings": optional [T, 4] per-frame stage milliseconds}
+    # align=True pairs frames along a banded DTW path, otherwise by index (shorter length).
+    if align:
+        band = max(1, int(round(ALIGN_BAND_SECONDS * (fps or 30.0))))
+        coach_index, alignment_cost = align_sequences(coach["keypoints"], student["keypoints"],
+                                                      band=band, threshold=threshold)
+    else:
+        coach_index = np.arange(min(len(coach["keypoints"]), len(student["keypoints"])))
+        alignment_cost = None
+    n = len(coach_index)
+
+    scores = score_pose_sequences(coach["keypoints"][coach_index], student["keypoints"][:n],
+                                  threshold=threshold)
+    coach_clip = np.asarray(coach["clip"][coach_index])
+    clip_sim = (coach_clip * np.asarray(student["clip"][:n])).sum(axis=-1)
+    labels = np.asarray(labels)
+
+    return {
+        "frame_num": np.arange(n),
+        "coach_frame": coach_index,
+        "coach_acc": scores["coach_accuracy"],
+        "student_acc": scores["student_accuracy"],
+        "pose_sim": scores["frame_similarity"],
+        "joint_sim": scores["joint_similarity"],
+        "clip_sim": clip_sim,
+        "coach_label": labels[np.asarray(coach["clip_logits"][coach_index]).argmax(axis=-1)],
+        "student_label": labels[np.asarray(student["clip_logits"][:n]).argmax(axis=-1)],
+        "ball1": np.asarray(coach["balls"][coach_index]),
+        "ball2": np.asarray(student["balls"][:n]),
+        "inferred": np.asarray(student["inferred"][:n]),
+        "timings": np.asarray(student["timings"][:n]) if "timings" in student else None,
+        "alignment_cost": alignment_cost
+    }
+
+
+def rescore_drill(drill_id, threshold=CONFIDENCE_THRESHOLD, align=True, write_db=False, overlay=False,
+                  prompts=None):
+    # ✅ Recompute every metric of a processed drill from its stored artifacts (no video inference).
+    # prompts: relabel against a new prompt set (text encoder only, embeddings are stored)
+    from utils.artifacts import load_drill_artifacts
+    from utils.benchmark_logger import BenchmarkLogger
+
+    coach, student, meta = load_drill_artifacts(drill_id)
+    labels = meta["labels"]
+    if prompts:
+        from services.model_registry import models
+        clip, labels = models.get("clip"), list(prompts)
+        coach = dict(coach, clip_logits=clip.prompt_logits(coach["clip"], labels))
+        student = dict(student, clip_logits=clip.prompt_logits(student["clip"], labels))
+
+    scored = score_drill(coach, student, labels, align=align, fps=meta.get("fps") or 30.0,
+                         threshold=threshold)
+
+    logger = BenchmarkLogger(drill_id, threshold=threshold)
+    logger.log_drill(scored)
+    result = {
+        "drill_id": drill_id,
+        "labels": list(labels),
+        "frames": len(logger.rows),
+        "csv": logger.save_to_csv(),
+        "charts": logger.save_summary_charts() or [],
+        "overlay_video": None,
+        "coach_avg": round(float(scored["coach_acc"].mean()), 2) if logger.rows else 0,
+        "student_avg": round(float(scored["student_acc"].mean()), 2) if logger.rows else 0,
+        "pose_avg": round(float(scored["pose_sim"].mean()), 2) if logger.rows else 0
+    }
+
+    if overlay and meta.get("student_path") and os.path.exists(meta["student_path"]):
+        result["overlay_video"] = logger.save_overlay_video(meta["student_path"], student["keypoints"])
+
+    if write_db:
+        from utils.db import DBLogger
+        with DBLogger() as db:
+            db.replace_performance(drill_id, logger.rows)
+            result["player_summaries_updated"] = db.refresh_player_summaries(drill_id)
+
+    return result
@@ -1,22 +1,84 @@
 import numpy as np
 
-def calculate_pose_similarity(coach_kps, student_kps):
-    def to_array(kps):
-        return np.array([(x, y) for (x, y, c) in kps if c > 0.5])
+CONFIDENCE_THRESHOLD = 0.3
+# Distance (in units of body RMS radius) at which a joint's similarity falls to ~61%
+SIMILARITY_SIGMA = 0.25
 
-    coach_arr = to_array(coach_kps)
-    student_arr = to_array(student_kps)
 
-    # Handle empty or mismatched keypoints
-    if len(coach_arr) == 0 or len(student_arr) == 0 or len(coach_arr) != len(student_arr):
-        return 0.0, 0.0, 0.0
+def as_sequence(keypoints):
+    # [17, 3] or [T, 17, 3] MoveNet output (y, x, score) → float32 [T, 17, 3]
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    if keypoints.ndim == 2:
+        keypoints = keypoints[None]
+    return keypoints
 
-    # Coach and student accuracy: confidence-averaged keypoints present
-    coach_acc = sum(1 for (_, _, c) in coach_kps if c > 0.5) / len(coach_kps) * 100
-    student_acc = sum(1 for (_, _, c) in student_kps if c > 0.5) / len(student_kps) * 100
 
-    # Pose similarity: mean Euclidean distance similarity
-    diffs = np.linalg.norm(coach_arr - student_arr, axis=1)
-    similarity = max(0, 100 - np.mean(diffs))  # Scale to 0-100
+def keypoint_accuracy(keypoints, threshold=CONFIDENCE_THRESHOLD):
+    # ✅ Percentage of confident keypoints per frame → [T]
+    keypoints = as_sequence(keypoints)
+    if keypoints.shape[0] == 0:
+        return np.zeros(0, np.float32)
+    return (keypoints[..., 2] > threshold).mean(axis=-1) * 100
 
-    return coach_acc, student_acc, similarity
+
+def _normalize(xy, weights, weight_sum):
+    # Translate to the weighted centroid and scale to unit weighted RMS radius
+    centroid = (weights[..., None] * xy).sum(axis=1) / weight_sum[:, None]
+    centered = xy - centroid[:, None, :]
+    radius = np.sqrt((weights * (centered ** 2).sum(axis=-1)).sum(axis=1) / weight_sum)
+    return centered / np.maximum(radius, 1e-6)[:, None, None]
+
+
+def normalized_poses(keypoints, threshold=CONFIDENCE_THRESHOLD):
+    # Per-frame translation/scale-normalized (x, y) [T, 17, 2] plus joint weights [T, 17]
+    keypoints = as_sequence(keypoints)
+    confidence = keypoints[..., 2]
+    weights = np.where(confidence > threshold, confidence, 0.0).astype(np.float32)
+    weight_sum = np.maximum(weights.sum(axis=1), 1e-6)
+    return _normalize(keypoints[..., [1, 0]], weights, weight_sum).astype(np.float32), weights
+
+
+def score_pose_sequences(coach, student, threshold=CONFIDENCE_THRESHOLD, rotation=True, sigma=SIMILARITY_SIGMA):
+    # ✅ Confidence-weighted, Procrustes-normalized pose similarity over whole sequences.
+    # coach/student: [T, 17, 3] (y, x, score). Returns per-joint [T, 17] and per-frame [T]
+    # similarity (0-100) plus per-frame keypoint accuracy for both sides.
+    coach, student = as_sequence(coach), as_sequence(student)
+    if coach.shape != student.shape:
+        raise ValueError(f"❌ Keypoint sequences differ in shape: {coach.shape} vs {student.shape}")
+
+    # A joint counts only when both sides see it; weight by joint confidence
+    coach_conf, student_conf = coach[..., 2], student[..., 2]
+    visible = (coach_conf > threshold) & (student_conf > threshold)
+    weights = np.where(visible, np.sqrt(coach_conf * student_conf), 0.0).astype(np.float32)
+    weight_sum = weights.sum(axis=1)
+    safe_sum = np.maximum(weight_sum, 1e-6)
+
+    a = _normalize(coach[..., [1, 0]], weights, safe_sum)
+    b = _normalize(student[..., [1, 0]], weights, safe_sum)
+
+    if rotation:
+        # Closed-form weighted 2D Procrustes rotation of student onto coach
+        cross = (weights * (b[..., 0] * a[..., 1] - b[..., 1] * a[..., 0])).sum(axis=1)
+        dot = (weights * (b[..., 0] * a[..., 0] + b[..., 1] * a[..., 1])).sum(axis=1)
+        theta = np.arctan2(cross, dot)
+        cos, sin = np.cos(theta)[:, None], np.sin(theta)[:, None]
+        b = np.stack([cos * b[..., 0] - sin * b[..., 1], sin * b[..., 0] + cos * b[..., 1]], axis=-1)
+
+    distance = np.linalg.norm(a - b, axis=-1)
+    joint_similarity = np.where(visible, 100 * np.exp(-0.5 * (distance / sigma) ** 2), 0.0)
+    frame_similarity = np.where(
+        weight_sum > 0, (weights * joint_similarity).sum(axis=1) / safe_sum, 0.0)
+
+    return {
+        "frame_similarity": np.minimum(frame_similarity, 100).astype(np.float32),
+        "joint_similarity": joint_similarity.astype(np.float32),
+        "coach_accuracy": keypoint_accuracy(coach, threshold).astype(np.float32),
+        "student_accuracy": keypoint_accuracy(student, threshold).astype(np.float32)
+    }
+
+
+def calculate_pose_similarity(coach_kps, student_kps, threshold=0.5):
+    # Single-frame convenience wrapper: (coach_acc, student_acc, similarity)
+    scores = score_pose_sequences(coach_kps, student_kps, threshold=threshold)
+    return (float(scores["coach_accuracy"][0]), float(scores["student_accuracy"][0]),
+            float(scores["frame_similarity"][0]))
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+import numpy as np
+
+# In-memory LRU size (prompts) and optional on-disk store ("" disables persistence)
+TEXT_CACHE_SIZE = int(os.getenv("CLIP_TEXT_CACHE_SIZE", "1024"))
+TEXT_CACHE_DIR = os.getenv("CLIP_TEXT_CACHE_DIR", "results/cache/clip_text")
+
+
+class TextEmbeddingCache:
+    # ✅ Normalized text embeddings keyed by (model, prompt): bounded LRU in memory,
+    # one .npy per prompt on disk so workers and restarts skip re-encoding
+    def __init__(self, max_entries=TEXT_CACHE_SIZE, cache_dir=TEXT_CACHE_DIR):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir or None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1("\0".join(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.npy")
+
+    def _remember(self, key, vector):
+        with self.lock:
+            self.entries[key] = vector
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get(self, model, prompt):
+        key = (model, prompt)
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is not None:
+                self.entries.move_to_end(key)
+                return vector
+        if not self.cache_dir:
+            return None
+        try:
+            vector = np.load(self._path(key))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable text embedding for '{prompt}': {e}")
+            return None
+        self._remember(key, vector)
+        return vector
+
+    def get_many(self, model, prompts):
+        # {prompt: vector} for the prompts already encoded
+        found = {}
+        for prompt in prompts:
+            vector = self.get(model, prompt)
+            if vector is not None:
+                found[prompt] = vector
+        return found
+
+    def put(self, model, prompt, vector):
+        key = (model, prompt)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+        if self.cache_dir:
+            path = self._path(key)
+            tmp_path = f"{path}.tmp-{uuid.uuid4().hex}.npy"
+            np.save(tmp_path, vector)
+            os.replace(tmp_path, path)
+        return vector
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from starlette.concurrency import run_in_threadpool
+
+STORE_DIR = os.getenv("UPLOAD_STORE_DIR", "videos/store")
+PROCESSED_DIR = os.getenv("PROCESSED_INDEX_DIR", "results/processed")
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "1024"))
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class StoredUpload:
+    def __init__(self, path, content_hash, size, duplicate):
+        self.path = path
+        self.content_hash = content_hash
+        self.size = size
+        self.duplicate = duplicate
+
+
+async def save_upload(upload, store_dir=STORE_DIR, max_mb=MAX_UPLOAD_MB):
+    # ✅ Stream an UploadFile into a content-addressed store without blocking the loop:
+    # chunks are hashed as they pass through, then the temp file is atomically renamed
+    max_bytes = int(max_mb * 1024 * 1024)
+    declared = getattr(upload, "size", None)
+    if declared is not None and declared > max_bytes:
+        raise UploadTooLargeError(f"{upload.filename} is larger than {max_mb:.0f} MB")
+
+    os.makedirs(store_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"{upload.filename} is larger than {max_mb:.0f} MB")
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+
+        content_hash = digest.hexdigest()
+        ext = os.path.splitext(upload.filename or "")[1].lower() or ".mp4"
+        path = os.path.join(store_dir, f"{content_hash}{ext}")
+        duplicate = os.path.exists(path)
+        if duplicate:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        return StoredUpload(path, content_hash, size, duplicate)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ProcessedIndex:
+    # ✅ Remembers the results produced for a (coach hash, student hash) pair
+    def __init__(self, index_dir=PROCESSED_DIR):
+        self.index_dir = index_dir
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def _path(self, coach_hash, student_hash):
+        return os.path.join(self.index_dir, f"{coach_hash}_{student_hash}.json")
+
+    def get(self, coach_hash, student_hash):
+        path = self._path(coach_hash, student_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            record = json.load(f)
+
+        # Results are written under drill-id based names; make sure a later
+        # drill with the same id hasn't overwritten them since
+        csv_path = record["result"].get("csv")
+        if not csv_path or not os.path.exists(csv_path) or os.path.getmtime(csv_path) != record["csv_mtime"]:
+            return None
+        return record
+
+    def save(self, coach_hash, student_hash, drill_id, result):
+        record = {
+            "drill_id": drill_id,
+            "result": result,
+            "csv_mtime": os.path.getmtime(result["csv"]) if result.get("csv") else None
+        }
+        path = self._path(coach_hash, student_hash)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp_path, path)
+        return record